@@ -1,159 +1,279 @@
 """
 Agente LangGraph 0.6.5 para análise de dados da Prefeitura do Rio de Janeiro
 Versão refatorada com estrutura modular
+
+As coleções ChromaDB devem ser provisionadas fora do processo do agente
+(python src/utils/initialize_embeddings.py). A criação automática na
+inicialização só ocorre com CHROMA_AUTO_INIT=true; caso contrário o agente
+segue em modo somente consulta.
 """
 
+from __future__ import annotations
+
+import asyncio
+import logging
 import warnings
-import chromadb
 import os
-from typing import Dict, Optional, TypedDict, List, Any
-from langchain_core.messages import HumanMessage
+import re
+import sys
+import time
+from functools import lru_cache
+from types import MappingProxyType
+from cachetools import TTLCache
+from typing import Annotated, Callable, Dict, Optional, TypedDict, List, Any, ClassVar
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
-
-# Importar nodes
-from src.nodes.router import router_node
-from src.nodes.sql_generator import sql_generator_node
-from src.nodes.sql_executor import sql_executor_node
-from src.nodes.response_synthesizer import response_synthesizer_node
-from src.nodes.conversational_responder import conversational_responder_node
-
-# Importar tools
-from src.tools.category_tools import CATEGORY_TOOLS
+from langgraph.graph.state import CompiledStateGraph
 
 # Importar configurações
-from src.config.settings import SUPPRESS_WARNINGS, CHROMA_PERSIST_DIRECTORY, CHROMA_COLLECTIONS
+from src.config.settings import (
+    SUPPRESS_WARNINGS, VERBOSE_STARTUP, LOG_LEVEL, CHROMA_CATEGORY_COLLECTION, CATEGORY_COLUMNS, CHROMA_AUTO_INIT,
+    TEST_QUESTIONS, TEST_CONCURRENCY, RESULT_CACHE_MAX_SIZE, RESULT_CACHE_TTL_SECONDS,
+    EMBEDDING_SIGNATURE, CONVERSATION_HISTORY_MAX_MESSAGES
+)
+
+# Importar utils (nodes, tools e inicializador são importados sob demanda)
+from src.utils.chroma_singleton import get_client, get_collection
+from src.utils.lru_checkpointer import LRUCheckpointSaver
+from src.utils.batching_embedder import BatchingEmbedder
+from src.utils.event_loop import install_uvloop, run as run_async
 
-# Importar utils para inicialização
-from src.utils.initialize_embeddings import CategoryEmbeddingsInitializer
+logger = logging.getLogger(__name__)
 
 # Suprimir warnings se configurado
 if SUPPRESS_WARNINGS:
     warnings.filterwarnings("ignore", category=UserWarning)
     warnings.filterwarnings("ignore", module="chromadb")
-    warnings.filterwarnings("ignore", message=".*telemetry.*")
+
+def _append_recent(history: List[Dict[str, str]], new: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Concatena as mensagens novas mantendo só as últimas do histórico (o checkpointer persiste a thread)"""
+    return (history + new)[-CONVERSATION_HISTORY_MAX_MESSAGES:]
 
 class AgentState(TypedDict):
     """Estado do agente"""
     question: str
     route: str
     sql_query: Optional[str]
+    query_job_id: Optional[str]
     data_result: Optional[List[Dict]]
     final_response: str
     error: Optional[str]
-    messages: List[Dict[str, str]]
+    # Reducer: nodes devolvem apenas as mensagens novas, que são concatenadas ao histórico limitado
+    messages: Annotated[List[Dict[str, str]], _append_recent]
     tool_context: Optional[str]
+    sql_hint: Optional[str]
+    sql_plan: Optional[Dict[str, Any]]
+
+# Estado inicial padrão, copiado a cada execução
+_INITIAL_STATE_TEMPLATE: AgentState = {
+    "question": "",
+    "route": "",
+    "sql_query": None,
+    "query_job_id": None,
+    "data_result": None,
+    "final_response": "",
+    "error": None,
+    "messages": [],
+    "tool_context": None,
+    "sql_hint": None,
+    "sql_plan": None
+}
+
+# Colunas categóricas exigidas na coleção compartilhada, calculadas uma única vez
+_REQUIRED_CATEGORIES = frozenset(CATEGORY_COLUMNS)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Mapa de rotas do router para o próximo node (demais rotas vão para o conversacional)
+_ROUTE_MAP = MappingProxyType({"data_query": "sql_generator"})
+
+def route_question(state: AgentState) -> str:
+    """Rota baseada na decisão do router (encerra se o router já respondeu)"""
+    g = state.get
+    if g("final_response"):
+        return END
+    return _ROUTE_MAP.get(g("route"), "conversational_responder")
+
+def check_sql_success(state: AgentState) -> str:
+    """Verifica se o SQL foi gerado com sucesso"""
+    g = state.get
+    return "sql_executor" if (g("sql_query") and not g("error")) else "response_synthesizer"
+
+def _normalize_question(question: str) -> str:
+    """Normaliza a pergunta para o cache exato (caixa e espaços)"""
+    return _WHITESPACE_RE.sub(" ", question.strip().lower())
+
+# Configuração padrão do grafo (somente leitura)
+_DEFAULT_CONFIG = MappingProxyType({"configurable": MappingProxyType({"thread_id": "default"})})
 
 class RioDataAgent:
     """Agente para análise de dados da Prefeitura do Rio de Janeiro"""
     
+    # Handles das coleções ChromaDB, compartilhados durante todo o processo
+    collections: Dict[str, Any] = {}
+    
+    # Grafos compilados compartilhados entre instâncias (topologia fixa):
+    # com checkpointer para conversas com thread_id e sem checkpointer para chamadas avulsas
+    _compiled_graph: ClassVar[Optional[CompiledStateGraph]] = None
+    _stateless_graph: ClassVar[Optional[CompiledStateGraph]] = None
+    
     def __init__(self):
         """Inicializa o agente com o grafo LangGraph"""
-        print("🚀 Inicializando agente...")
+        logger.info("🚀 Inicializando agente...")
         
         # Verificar e inicializar ChromaDB se necessário
         self._ensure_chromadb_initialized()
         
-        # Construir o grafo
-        self.graph = self._build_graph()
-        print("✅ Agente inicializado com sucesso!")
+        # Construir o grafo apenas uma vez por processo
+        if RioDataAgent._compiled_graph is None:
+            workflow = self._build_graph()
+            # Compilar com memory limitada (LRU por thread_id)
+            RioDataAgent._compiled_graph = workflow.compile(checkpointer=LRUCheckpointSaver())
+            RioDataAgent._stateless_graph = workflow.compile()
+        self.graph = RioDataAgent._compiled_graph
+        self.stateless_graph = RioDataAgent._stateless_graph
+        
+        # Cache exato de respostas das execuções avulsas, por pergunta normalizada
+        self._answer_cache = TTLCache(maxsize=RESULT_CACHE_MAX_SIZE, ttl=RESULT_CACHE_TTL_SECONDS)
+        
+        # Inicializar cliente de embeddings e pré-roteador conversacional
+        self.embedding_client = self._init_embedding_client()
+        self.batching_embedder = BatchingEmbedder(self.embedding_client) if self.embedding_client else None
+        self.conversational_prefilter = self._init_conversational_prefilter()
+        logger.info("✅ Agente inicializado com sucesso!")
     
     def _ensure_chromadb_initialized(self):
         """Verifica se as coleções ChromaDB existem e as inicializa se necessário"""
         try:
-            print("🔍 Verificando coleções ChromaDB...")
-            chroma_client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIRECTORY)
+            logger.info("🔍 Verificando coleções ChromaDB...")
+            self.chroma_client = get_client()
             
-            # Verificar se todas as coleções existem
-            missing_collections = []
+            # Todas as colunas categóricas compartilham uma coleção (filtradas pelo metadado "category")
+            existing_names = {c.name for c in self.chroma_client.list_collections()}
+            missing_categories = sorted(_REQUIRED_CATEGORIES)
             total_embeddings = 0
             
-            for collection_key, collection_name in CHROMA_COLLECTIONS.items():
+            count_embeddings = VERBOSE_STARTUP and logger.isEnabledFor(logging.DEBUG)
+            
+            if CHROMA_CATEGORY_COLLECTION in existing_names:
                 try:
-                    collection = chroma_client.get_collection(collection_name)
-                    count = collection.count()
-                    total_embeddings += count
-                    print(f"  ✅ {collection_name}: {count} embeddings")
-                except Exception:
-                    missing_collections.append((collection_key, collection_name))
+                    collection = get_collection(CHROMA_CATEGORY_COLLECTION)
+                    metadata = collection.metadata or {}
+                    # Coleções criadas com outro modelo/dimensão de embedding não servem para consulta
+                    embedding_model = metadata.get("embedding_model")
+                    if embedding_model != EMBEDDING_SIGNATURE:
+                        raise ValueError(f"embeddings de {embedding_model or 'modelo desconhecido'}")
+                    RioDataAgent.collections[CHROMA_CATEGORY_COLLECTION] = collection
+                    # Carregar os vetores em segundo plano: a primeira busca não paga a leitura da coleção
+                    from src.tools.category_tools import category_tools
+                    category_tools.warm_up()
+                    missing_categories = sorted(
+                        _REQUIRED_CATEGORIES - set(metadata.get("categories", "").split(","))
+                    )
+                    # count() varre os segmentos da coleção, só executar em modo verboso
+                    if count_embeddings:
+                        total_embeddings = collection.count()
+                except Exception as e:
+                    logger.warning("⚠️ Coleção %s inválida: %s", CHROMA_CATEGORY_COLLECTION, e)
             
             # Se há coleções faltando, verificar pré-requisitos para inicialização
-            if missing_collections:
-                print(f"⚠️ Encontradas {len(missing_collections)} coleções faltando")
+            if missing_categories:
+                logger.warning("⚠️ Encontradas %d categorias faltando: %s", len(missing_categories), ", ".join(missing_categories))
+                
+                # Em produção a ingestão não deve rodar no caminho de inicialização
+                if not CHROMA_AUTO_INIT:
+                    logger.warning("💡 CHROMA_AUTO_INIT desabilitado. Continuando em modo somente consulta...")
+                    logger.warning("💡 Para criar as coleções, execute: python src/utils/initialize_embeddings.py")
+                    return
                 
                 # Verificar pré-requisitos
                 if not self._check_initialization_prerequisites():
-                    print("❌ Pré-requisitos não atendidos. Continuando sem busca por similaridade...")
-                    print("\n� Para habilitar busca por similaridade:")
-                    print("   1. Configure GOOGLE_APPLICATION_CREDENTIALS")
-                    print("   2. Configure OPENAI_API_KEY") 
-                    print("   3. Execute: python src/utils/initialize_embeddings.py")
+                    logger.warning("❌ Pré-requisitos não atendidos. Continuando sem busca por similaridade...")
+                    logger.warning("💡 Para habilitar busca por similaridade:")
+                    logger.warning("   1. Configure GOOGLE_APPLICATION_CREDENTIALS")
+                    logger.warning("   2. Configure OPENAI_API_KEY")
+                    logger.warning("   3. Execute: python src/utils/initialize_embeddings.py")
                     return
                 
-                print("�🔄 Inicializando coleções ChromaDB automaticamente...")
+                logger.info("🔄 Inicializando coleções ChromaDB automaticamente...")
                 
                 try:
+                    from src.utils.initialize_embeddings import CategoryEmbeddingsInitializer
                     initializer = CategoryEmbeddingsInitializer()
                     initializer.initialize_all_collections()
-                    print("✅ Coleções ChromaDB inicializadas com sucesso!")
+                    logger.info("✅ Coleções ChromaDB inicializadas com sucesso!")
                 except Exception as e:
-                    print(f"❌ Erro na inicialização automática: {e}")
-                    print("💡 Execute manualmente: python src/utils/initialize_embeddings.py")
+                    logger.error("❌ Erro na inicialização automática: %s", e)
+                    logger.warning("💡 Execute manualmente: python src/utils/initialize_embeddings.py")
             else:
-                print(f"✅ Todas as coleções ChromaDB estão disponíveis ({total_embeddings} embeddings total)")
+                if count_embeddings:
+                    logger.debug("✅ Todas as coleções ChromaDB estão disponíveis (%d embeddings total)", total_embeddings)
+                else:
+                    logger.info("✅ Todas as %d categorias ChromaDB estão disponíveis", len(CATEGORY_COLUMNS))
                 
         except Exception as e:
-            print(f"⚠️ Aviso: Erro ao verificar ChromaDB: {e}")
-            print("💡 O agente continuará, mas a busca por similaridade pode não funcionar")
-            print("💡 Para resolver, execute: python src/utils/initialize_embeddings.py")
+            logger.warning("⚠️ Aviso: Erro ao verificar ChromaDB: %s", e)
+            logger.warning("💡 O agente continuará, mas a busca por similaridade pode não funcionar")
+            logger.warning("💡 Para resolver, execute: python src/utils/initialize_embeddings.py")
+    
+    def _init_embedding_client(self):
+        """Inicializa o cliente de embeddings usado pelo pré-roteador"""
+        try:
+            from src.config.settings import get_openai_api_key
+            from src.utils.openai_client import OpenAIClient
+            from src.utils.cached_embedder import CachedEmbedder
+            return CachedEmbedder(OpenAIClient(api_key=get_openai_api_key()))
+        except Exception as e:
+            logger.warning("⚠️ Cliente de embeddings indisponível: %s", e)
+            return None
     
-    def _check_initialization_prerequisites(self):
-        """Verifica se os pré-requisitos para inicialização estão atendidos"""
-        print("🔍 Verificando pré-requisitos...")
+    def _init_conversational_prefilter(self):
+        """Inicializa o pré-roteador conversacional, desabilitando-o em caso de falha"""
+        if self.embedding_client is None:
+            return None
+        try:
+            from src.utils.conversational_prefilter import ConversationalPrefilter
+            return ConversationalPrefilter(self.embedding_client)
+        except Exception as e:
+            logger.warning("⚠️ Pré-roteador conversacional desabilitado: %s", e)
+            return None
+    
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def _check_initialization_prerequisites() -> bool:
+        """Verifica se os pré-requisitos para inicialização estão atendidos (resultado memoizado)"""
+        logger.debug("🔍 Verificando pré-requisitos...")
+        env = os.environ
         
         # Verificar OPENAI_API_KEY
-        openai_key = os.getenv('OPENAI_API_KEY')
+        openai_key = env.get('OPENAI_API_KEY')
         if not openai_key:
-            print("  ❌ OPENAI_API_KEY não configurada")
+            logger.warning("  ❌ OPENAI_API_KEY não configurada")
             return False
         else:
-            print("  ✅ OPENAI_API_KEY configurada")
+            logger.debug("  ✅ OPENAI_API_KEY configurada")
         
         # Verificar GOOGLE_APPLICATION_CREDENTIALS
-        google_creds = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+        google_creds = env.get('GOOGLE_APPLICATION_CREDENTIALS')
         if not google_creds:
-            print("  ❌ GOOGLE_APPLICATION_CREDENTIALS não configurada")
+            logger.warning("  ❌ GOOGLE_APPLICATION_CREDENTIALS não configurada")
             return False
         elif not os.path.exists(google_creds):
-            print(f"  ❌ Arquivo de credenciais não encontrado: {google_creds}")
+            logger.warning("  ❌ Arquivo de credenciais não encontrado: %s", google_creds)
             return False
         else:
-            print("  ✅ GOOGLE_APPLICATION_CREDENTIALS configurada")
+            logger.debug("  ✅ GOOGLE_APPLICATION_CREDENTIALS configurada")
         
         return True
     
     def _build_graph(self) -> StateGraph:
-        """Constrói o grafo de estados do LangGraph"""
+        """Constrói o grafo de estados do LangGraph (sem compilar)"""
         
-        # Definir funções de roteamento
-        def route_question(state: AgentState) -> str:
-            """Rota baseada na decisão do router"""
-            route = state.get("route", "conversational")
-            if route == "data_query":
-                return "sql_generator"
-            else:
-                return "conversational_responder"
-        
-        def check_sql_success(state: AgentState) -> str:
-            """Verifica se o SQL foi gerado com sucesso"""
-            if state.get("sql_query") and not state.get("error"):
-                return "sql_executor"
-            else:
-                return "response_synthesizer"
-        
-        def check_execution_success(state: AgentState) -> str:
-            """Verifica se a execução foi bem-sucedida"""
-            return "response_synthesizer"
+        # Importar nodes apenas na construção do grafo (evita custo no import do módulo)
+        from src.nodes.router import router_node
+        from src.nodes.sql_generator import sql_generator_node
+        from src.nodes.sql_executor import sql_executor_node
+        from src.nodes.response_synthesizer import response_synthesizer_node
+        from src.nodes.conversational_responder import conversational_responder_node
         
         # Criar grafo
         workflow = StateGraph(AgentState)
@@ -174,7 +294,8 @@ class RioDataAgent:
             route_question,
             {
                 "sql_generator": "sql_generator",
-                "conversational_responder": "conversational_responder"
+                "conversational_responder": "conversational_responder",
+                END: END
             }
         )
         
@@ -188,82 +309,197 @@ class RioDataAgent:
             }
         )
         
-        # SQL Executor para Response Synthesizer
-        workflow.add_conditional_edges(
-            "sql_executor",
-            check_execution_success,
-            {
-                "response_synthesizer": "response_synthesizer"
-            }
-        )
+        # SQL Executor para Response Synthesizer (incondicional)
+        workflow.add_edge("sql_executor", "response_synthesizer")
         
         # Terminar nos nodes finais
         workflow.add_edge("response_synthesizer", END)
         workflow.add_edge("conversational_responder", END)
         
-        # Compilar com memory
-        memory = MemorySaver()
-        
-        return workflow.compile(checkpointer=memory)
+        return workflow
     
-    def run(self, question: str, config: Optional[Dict] = None) -> str:
+    async def _record_turn(self, config: Dict, question: str, answer: str):
+        """Grava no checkpoint da thread um turno respondido fora do grafo (pré-roteador)"""
+        try:
+            await self.graph.aupdate_state(config, {
+                "question": question,
+                "route": "conversational",
+                "final_response": answer,
+                "messages": [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+            }, as_node="conversational_responder")
+        except Exception as e:
+            logger.warning("⚠️ Erro ao registrar o turno no histórico: %s", e)
+    
+    def run(self, question: str, config: Optional[Dict] = None, no_cache: bool = False) -> str:
+        """Versão síncrona de arun, usada pela CLI"""
+        return run_async(self.arun(question, config=config, no_cache=no_cache))
+    
+    async def arun(self, question: str, config: Optional[Dict] = None, no_cache: bool = False,
+                   on_node: Optional[Callable[[str], None]] = None,
+                   on_token: Optional[Callable[[str], None]] = None) -> str:
         """
         Executa o agente com uma pergunta
         
         Args:
             question: Pergunta do usuário
-            config: Configuração opcional para o grafo
+            config: Configuração opcional para o grafo; sem thread_id a execução
+                    é avulsa e dispensa o checkpointer
+            no_cache: Se True, ignora o cache de respostas (para perguntas sensíveis)
+            on_node: Callback opcional chamado com o nome de cada node concluído
+            on_token: Callback opcional chamado com cada trecho da resposta final em streaming
             
         Returns:
             Resposta final do agente
         """
-        # Estado inicial
-        initial_state: AgentState = {
-            "question": question,
-            "route": "",
-            "sql_query": None,
-            "data_result": None,
-            "final_response": "",
-            "error": None,
-            "messages": [{"role": "user", "content": question}],
-            "tool_context": None
-        }
-        
-        # Configuração padrão
+        # Sem thread_id não há conversa a persistir: usar o grafo sem checkpointer
+        stateful = bool(config and config.get("configurable", {}).get("thread_id"))
+        graph = self.graph if stateful else self.stateless_graph
         if config is None:
-            config = {"configurable": {"thread_id": "default"}}
+            config = _DEFAULT_CONFIG
+        
+        answer_key = _normalize_question(question)
+        
+        # Perguntas repetidas (após normalização) não precisam nem de embedding. Só em
+        # execuções avulsas: numa thread a mesma pergunta depende do histórico da conversa
+        use_answer_cache = not stateful and not no_cache
+        if use_answer_cache:
+            cached_answer = self._answer_cache.get(answer_key)
+            if cached_answer is not None:
+                logger.info("⚡ Resposta obtida do cache de respostas")
+                return cached_answer
+        
+        # Embedding da pergunta para o pré-roteador conversacional
+        embedding = None
+        if self.conversational_prefilter is not None:
+            try:
+                embedding = await self.batching_embedder.embed(question)
+            except Exception as e:
+                logger.warning("⚠️ Erro ao gerar embedding da pergunta: %s", e)
+        
+        # Estado inicial a partir do template (dict.copy é implementado em C)
+        initial_state = _INITIAL_STATE_TEMPLATE.copy()
+        initial_state["question"] = question
+        initial_state["messages"] = [{"role": "user", "content": question}]
         
         try:
-            # Executar grafo
-            result = self.graph.invoke(initial_state, config=config)
-            return result.get("final_response", "Erro: Não foi possível gerar resposta")
+            # Perguntas claramente conversacionais não passam pelo grafo
+            if (embedding is not None and self.conversational_prefilter is not None
+                    and self.conversational_prefilter.is_conversational(embedding)):
+                from src.nodes.conversational_responder import conversational_responder_node
+                logger.info("⚡ Pergunta conversacional respondida sem o grafo")
+                result = await conversational_responder_node(initial_state)
+                result["route"] = "conversational"
+                if stateful and result.get("final_response"):
+                    await self._record_turn(config, question, result["final_response"])
+            else:
+                # Executar grafo (nodes assíncronos, sem bloquear o event loop)
+                result = dict(initial_state)
+                async for mode, chunk in graph.astream(
+                    initial_state, config=config, stream_mode=["updates", "custom"]
+                ):
+                    if mode == "custom":
+                        if on_token is not None and "token" in chunk:
+                            on_token(chunk["token"])
+                        continue
+                    
+                    for node_name, node_output in chunk.items():
+                        if node_output:
+                            history = result["messages"]
+                            result.update(node_output)
+                            result["messages"] = _append_recent(history, node_output.get("messages", []))
+                        if on_node is not None:
+                            on_node(node_name)
+            
+            final_response = result.get("final_response")
+            
+            if not final_response:
+                return "Erro: Não foi possível gerar resposta"
+            
+            # Armazenar apenas respostas bem-sucedidas
+            if use_answer_cache and not result.get("error"):
+                self._answer_cache[answer_key] = final_response
+            
+            return final_response
             
         except Exception as e:
-            error_msg = f"Erro no agente: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error("❌ Erro no agente: %s", e)
             return "Desculpe, ocorreu um erro interno. Tente novamente ou reformule sua pergunta."
 
+async def repl(agent: RioDataAgent):
+    """Loop interativo assíncrono com progresso dos nodes em tempo real"""
+    from prompt_toolkit import PromptSession
+    
+    session = PromptSession()
+    
+    while True:
+        try:
+            question = (await session.prompt_async("\n👤 Sua pergunta (ou 'quit' para sair): ")).strip()
+        except (EOFError, KeyboardInterrupt):
+            question = "quit"
+        
+        if question.lower() in ['quit', 'sair', 'exit']:
+            print("👋 Obrigado por usar o agente!")
+            break
+        
+        if not question:
+            continue
+        
+        print("🤔 Processando...")
+        streamed = []
+        
+        def print_token(token):
+            if not streamed:
+                print("🤖 ", end="")
+            streamed.append(token)
+            print(token, end="", flush=True)
+        
+        response = await agent.arun(
+            question,
+            config=_DEFAULT_CONFIG,
+            on_node=lambda node: print(f"  ⏳ {node}", flush=True),
+            on_token=print_token
+        )
+        
+        # Respostas de cache ou sem streaming são impressas de uma vez
+        if streamed:
+            print()
+        else:
+            print(f"🤖 {response}")
+
+async def run_test_questions(agent: RioDataAgent):
+    """Executa as perguntas de teste em paralelo, limitadas por um semáforo"""
+    semaphore = asyncio.Semaphore(TEST_CONCURRENCY)
+    
+    async def ask(question: str):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await agent.arun(question)
+            return response, time.perf_counter() - start
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*(ask(q) for q in TEST_QUESTIONS))
+    elapsed = time.perf_counter() - start
+    
+    for question, (response, question_elapsed) in zip(TEST_QUESTIONS, results):
+        print(f"\n👤 {question}")
+        print(f"🤖 {response}")
+        print(f"⏱️ {question_elapsed:.1f}s")
+    
+    # Com execução concorrente o tempo total tende ao da pergunta mais lenta, não à soma
+    print(f"\n⏱️ Tempo total: {elapsed:.1f}s (soma individual: {sum(t for _, t in results):.1f}s)")
+
 def main():
-    """Função principal para testar o agente"""
+    """Função principal para testar o agente (use --test para rodar as perguntas de teste)"""
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
+    install_uvloop()
     print("🤖 Inicializando Agente de Dados da Prefeitura do Rio de Janeiro...")
     
     try:
         agent = RioDataAgent()
-        
-        # Loop interativo
-        while True:
-            question = input("\n👤 Sua pergunta (ou 'quit' para sair): ").strip()
-            
-            if question.lower() in ['quit', 'sair', 'exit']:
-                print("👋 Obrigado por usar o agente!")
-                break
-            
-            if not question:
-                continue
-            
-            print("🤔 Processando...")
-            response = agent.run(question)
-            print(f"🤖 {response}")
+        if "--test" in sys.argv[1:]:
+            run_async(run_test_questions(agent))
+        else:
+            run_async(repl(agent))
             
     except Exception as e:
         print(f"❌ Erro ao inicializar agente: {e}")
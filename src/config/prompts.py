@@ -2,15 +2,24 @@
 Configurações centralizadas do agente
 """
 
+import re
+import string
+
 # Prompts Templates
 ROUTER_PROMPT = """
+Você é um assistente de análise de dados da Prefeitura do Rio de Janeiro.
 Analise a seguinte pergunta e determine se ela requer consulta a dados ou é conversacional.
 
 Pergunta: "{question}"
 
-Responda APENAS com uma das opções:
-- "data_query" se a pergunta for sobre dados/estatísticas (ex: quantos, qual, quais, como, quando sobre chamados, bairros, etc.)
-- "conversational" se for saudação, agradecimento, pergunta genérica ou não relacionada a dados específicos
+Responda APENAS com um objeto JSON no formato:
+{{"intent": "data_query" | "conversational", "conversational_answer": string | null, "sql_hint": string | null}}
+
+Regras:
+- intent "data_query" se a pergunta for sobre dados/estatísticas (ex: quantos, qual, quais, como, quando sobre chamados, bairros, etc.)
+- intent "conversational" se for saudação, agradecimento, pergunta genérica ou não relacionada a dados específicos
+- conversational_answer: apenas quando intent for "conversational". Responda de forma amigável e profissional, em português. Se a pergunta não for relacionada a dados da prefeitura, seja educado mas redirecione para seu propósito principal.
+- sql_hint: apenas quando intent for "data_query". Resuma em uma frase os filtros, agregações e colunas relevantes para a consulta SQL.
 
 Exemplos:
 - "Quantos chamados foram abertos?" -> data_query
@@ -20,15 +29,20 @@ Exemplos:
 - "Me dê sugestões de brincadeiras" -> conversational
 """
 
+# O prompt de sistema do gerador de SQL é estático (schemas + instruções) para que o
+# prefixo idêntico entre chamadas seja aproveitado pelo cache de prompt do provedor;
+# histórico da conversa vem em mensagem separada e os resultados das tools continuam
+# a mesma conversa como mensagens role "tool".
 SQL_GENERATOR_SYSTEM_PROMPT = """Você é um especialista em SQL para BigQuery. 
 
 INSTRUÇÕES PARA USO DAS TOOLS:
 - Se a pergunta mencionar termos que podem corresponder a colunas categóricas, use as tools para encontrar valores exatos
-- Tools disponíveis:
-* get_nome_unidade_organizacional: Para buscar unidades organizacionais
-* get_id_unidade_organizacional_mae: Para buscar unidades mãe  
-* get_tipo: Para buscar tipos de chamados
-* get_subtipo: Para buscar subtipos específicos
+- Tool disponível: get_category_matches(category, query), com category sendo:
+* nome_unidade_organizacional: Para buscar unidades organizacionais
+* id_unidade_organizacional_mae: Para buscar unidades mãe
+* tipo: Para buscar tipos de chamados
+* subtipo: Para buscar subtipos específicos
+- Faça uma chamada por termo/categoria; várias chamadas no mesmo turno são executadas juntas
 - Use as tools ANTES de gerar o SQL para garantir valores corretos
 
 Primeiro, faça um REASONING sobre a descrição do schema e como ela consegue atender à pergunta.
@@ -57,43 +71,21 @@ INSTRUÇÕES:
 3. Se mencionar nomes de bairros, faça JOIN com a tabela de bairros
 4. O SQL gerado será executado imediatamente, não adicione explicações ou comentários
 
-{agent_scratchpad}
-
-Formato:
-REASONING: [seu raciocínio]
-SQL: [apenas o código SQL]"""
-
-TOOL_CONTEXT_PROMPT = """Você é um especialista em SQL para BigQuery.
-
-INSTRUÇÕES:
-- Use os resultados das tools abaixo para gerar a consulta SQL
+AO RECEBER OS RESULTADOS DAS TOOLS:
+- Use os valores encontrados nos filtros da consulta
 - Se as tools não encontraram resultados similares, use LIKE com wildcards para buscar termos relacionados
-- NUNCA retorne [] ou SQL inválida - sempre gere uma consulta válida
-- Se não encontrou valores exatos, use termos mais genéricos ou padrões LIKE
-
-RESULTADOS DAS TOOLS:
-{tool_context}
-
-DESCRIÇÃO DA TABELA DE CHAMADOS:
-{schema_chamado}
-
-DESCRIÇÃO DA TABELA DADOS DOS BAIRROS:
-{schema_bairro}
-
-INSTRUÇÕES PARA FALLBACK:
 - Se não encontrou "Iluminação Pública", use LIKE '%iluminação%' ou '%lâmpada%' ou '%poste%'
 - Se não encontrou "reparo de buraco", use LIKE '%buraco%' ou '%pavimentação%' ou '%via%'
 - Se não encontrou "fiscalização estacionamento", use LIKE '%fiscalização%' e '%estacionamento%'
-- Sempre prefira gerar SQL funcional mesmo que aproximada
+- NUNCA retorne [] ou SQL inválida - sempre gere uma consulta válida, mesmo que aproximada
 - SEMPRE use nomes completos de tabelas: `datario.adm_central_atendimento_1746.chamado` e `datario.dados_mestres.bairro`
-- NUNCA use apenas "chamado" ou "bairro" - sempre com o dataset completo
-
-Primeiro, faça um REASONING sobre como usar os resultados das tools ou fallback.
-Depois gere uma consulta SQL otimizada e VÁLIDA.
 
 Formato:
 REASONING: [seu raciocínio]
-SQL: [apenas o código SQL válido]"""
+SQL: [apenas o código SQL]"""
+
+CONVERSATION_CONTEXT_PROMPT = """HISTÓRICO DA CONVERSA:
+{history}"""
 
 RESPONSE_SYNTHESIZER_PROMPT = """
 Você é um assistente especializado em análise de dados da Prefeitura do Rio de Janeiro.
@@ -124,6 +116,29 @@ Pergunta: {question}
 Responda de forma amigável e profissional. Se a pergunta não for relacionada a dados da prefeitura, seja educado mas redirecione para seu propósito principal.
 """
 
+# Mensagens triviais (apenas a saudação/agradecimento, sem outro conteúdo) respondidas sem chamar o LLM
+GREETING_RE = re.compile(
+    r"^\s*(?:(?P<saudacao>olá|ola|oi|bom dia|boa tarde|boa noite)(?:\s*,?\s*tudo (?:bem|bom))?"
+    r"|(?P<agradecimento>(?:muito )?obrigad[oa]|valeu)"
+    r"|(?P<despedida>tchau|até logo|até mais))[\s!.?]*$",
+    re.IGNORECASE
+)
+
+CANNED_RESPONSES = {
+    "saudacao": "Olá! Sou o assistente de análise de dados da Prefeitura do Rio de Janeiro. "
+                "Posso responder perguntas sobre os chamados do 1746, como volumes por tipo, bairro ou período. "
+                "Como posso ajudar?",
+    "agradecimento": "Por nada! Se precisar de mais alguma informação sobre os chamados do 1746, é só perguntar.",
+    "despedida": "Até logo! Quando quiser consultar os dados dos chamados do 1746, estarei por aqui.",
+}
+
+def canned_response(question):
+    """Retorna a resposta pronta para saudações/agradecimentos triviais, ou None"""
+    match = GREETING_RE.match(question or "")
+    if match is None:
+        return None
+    return CANNED_RESPONSES[match.lastgroup]
+
 # Constantes
 DEFAULT_SCHEMAS_PATH = {
     "chamado": "static/schemas/schema_chamado.txt",
@@ -157,4 +172,31 @@ FALLBACK_SQL_PATTERNS = {
     ORDER BY total DESC
     LIMIT 1
     """
-}
\ No newline at end of file
+}
+
+def compile_prompt(template):
+    """
+    Pré-processa um template de .format() uma única vez
+    
+    Retorna uma função que apenas concatena os trechos literais com os valores,
+    sem reinterpretar o template (chaves escapadas já resolvidas) a cada chamada.
+    """
+    fields = list(dict.fromkeys(name for _, name, _, _ in string.Formatter().parse(template) if name))
+    marked = template.format(**{name: f"\x00{name}\x00" for name in fields})
+    parts = marked.split("\x00")
+    literals, names = parts[0::2], parts[1::2]
+    
+    def render(**values):
+        chunks = [literals[0]]
+        for name, literal in zip(names, literals[1:]):
+            chunks.append(str(values[name]))
+            chunks.append(literal)
+        return "".join(chunks)
+    
+    return render
+
+# Templates pré-compilados usados a cada pergunta
+ROUTER_TEMPLATE = compile_prompt(ROUTER_PROMPT)
+CONVERSATIONAL_TEMPLATE = compile_prompt(CONVERSATIONAL_PROMPT)
+RESPONSE_SYNTHESIZER_TEMPLATE = compile_prompt(RESPONSE_SYNTHESIZER_PROMPT)
+CONVERSATION_CONTEXT_TEMPLATE = compile_prompt(CONVERSATION_CONTEXT_PROMPT)
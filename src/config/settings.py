@@ -4,20 +4,44 @@ TEMPERATURE = 1
 """
 
 import os
+from functools import lru_cache
 
 # OpenAI Configuration
 OPENAI_BASE_URL = "https://api.openai.com/v1"
 OPENAI_MODEL = "gpt-5"
-OPENAI_EMBEDDING_MODEL = "text-embedding-3-large"
+OPENAI_ROUTER_MODEL = "gpt-4o-mini"  # Modelo menor para classificação de intenção
+OPENAI_CHAT_MODEL = "gpt-4o-mini"  # Modelo menor para respostas conversacionais
+OPENAI_CHAT_TEMPERATURE = 0.7
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+OPENAI_EMBEDDING_DIMENSIONS = 512  # Vocabulário categórico pequeno: vetores truncados bastam
+# Identifica o espaço vetorial; coleções/caches criados com outro modelo ou dimensão são descartados
+EMBEDDING_SIGNATURE = f"{OPENAI_EMBEDDING_MODEL}@{OPENAI_EMBEDDING_DIMENSIONS}"
+OPENAI_TIMEOUT_SECONDS = 120
+OPENAI_CONNECT_TIMEOUT_SECONDS = 5  # Falha rápido no handshake; a leitura ainda pode levar OPENAI_TIMEOUT_SECONDS
+HTTP_MAX_CONNECTIONS = 32  # Pool de conexões keep-alive compartilhado
+# Chat completions: requisições simultâneas por event loop e retentativas (backoff exponencial com jitter)
+OPENAI_MAX_INFLIGHT = int(os.getenv("OPENAI_MAX_INFLIGHT", "20"))
+OPENAI_MAX_RETRIES = 4
+OPENAI_RETRY_INITIAL_SECONDS = 0.5
+OPENAI_RETRY_MAX_SECONDS = 30
+
+# Dispara o planejamento de tools do SQL em paralelo à classificação do router
+SPECULATIVE_SQL_PLANNING = True
 
 # ChromaDB Configuration
 CHROMA_PERSIST_DIRECTORY = "./chroma_db"
-CHROMA_COLLECTIONS = {
-    "tipo": "tipo_collection",
-    "subtipo": "subtipo_collection", 
-    "nome_unidade_organizacional": "unidade_organizacional_collection",
-    "id_unidade_organizacional_mae": "unidade_mae_collection"
-}
+CHROMA_MODE = os.getenv("CHROMA_MODE", "persistent")  # "persistent" (dev) ou "server"
+CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+# Uma única coleção para todas as colunas, com o metadado "category" por valor
+# (armazenamento dos vetores; a busca é exata em memória, o índice HNSW não é consultado)
+CHROMA_CATEGORY_COLLECTION = "categories"
+CATEGORY_COLUMNS = ("tipo", "subtipo", "nome_unidade_organizacional", "id_unidade_organizacional_mae")
+# Snapshot NumPy da coleção, gravado pelo inicializador e lido pelas tools no lugar do collection.get()
+CATEGORY_MATRICES_PATH = f"{CHROMA_PERSIST_DIRECTORY}/category_matrices.npz"
+
+# Criação automática das coleções na inicialização do agente (desabilitada em produção)
+CHROMA_AUTO_INIT = os.getenv("CHROMA_AUTO_INIT", "false").lower() in ("1", "true", "yes")
 
 # Similarity Search Configuration
 SIMILARITY_THRESHOLD = 0.3
@@ -32,13 +56,82 @@ SCHEMA_FILES = {
 # Model Configuration
 TEMPERATURE = 1
 
-# Thread Pool Configuration  
-THREAD_POOL_MAX_WORKERS = 3
-BATCH_SIZE = 1000
+# Embedding Initialization Configuration (lotes enviados concorrentemente)
+EMBEDDING_INIT_CONCURRENCY = 8
+BATCH_SIZE = 1000  # Máximo de textos por requisição (a API aceita até 2048)
+EMBEDDING_BATCH_MAX_TOKENS = 250_000  # Máximo de tokens por requisição (limite da API: 300k)
+CHROMA_WRITE_BATCH_SIZE = 5000  # Registros por upsert no Chroma (limitado também pelo max_batch_size do cliente)
+
+# BigQuery Configuration (limite de bytes por consulta, validado via dry-run)
+BIGQUERY_MAX_BYTES_BILLED = 10_000_000_000
+BIGQUERY_STORAGE_MIN_ROWS = 5000  # A partir daqui, ler via Storage Read API (Arrow)
+# Jobs submetidos pelo gerador de SQL e ainda não lidos pelo executor (limite e tempo máximo de espera)
+BIGQUERY_PENDING_JOBS_MAX_SIZE = 256
+BIGQUERY_PENDING_JOBS_TTL_SECONDS = 600
+
+# Response Synthesizer Configuration (linhas e caracteres dos dados enviados ao prompt)
+SYNTHESIZER_MAX_ROWS = 10
+SYNTHESIZER_MAX_CHARS = 4000
+
+# Result Cache Configuration (respostas por pergunta normalizada e resultados por SQL)
+RESULT_CACHE_MAX_SIZE = 256
+RESULT_CACHE_TTL_SECONDS = 3600
+
+# LLM Cache Configuration (completions do router e do sintetizador por prompt exato; None desabilita)
+LLM_CACHE_DB_PATH = "./semantic_cache/llm_cache.db"
+LLM_CACHE_TTL_SECONDS = 3600
+
+# Embedding Cache Configuration (entradas em memória por processo)
+EMBEDDING_CACHE_MAX_SIZE = 10_000
+EMBEDDING_CACHE_DB_PATH = "./semantic_cache/embeddings.db"  # Persistência entre processos (None desabilita)
+
+# Embedding Batching Configuration (janela de agrupamento de perguntas)
+EMBEDDING_BATCH_MAX_SIZE = 64
+EMBEDDING_BATCH_MAX_WAIT_SECONDS = 0.02
+
+# Conversational Prefilter Configuration
+CONVERSATIONAL_PREFILTER_THRESHOLD = 0.9
+CONVERSATIONAL_EXEMPLARS = [
+    "Olá", "Oi", "Olá, tudo bem?", "Oi, tudo bem?", "Bom dia", "Boa tarde", "Boa noite",
+    "E aí", "Tudo bem?", "Como vai?", "Como você está?", "Prazer em conhecer",
+    "Obrigado", "Obrigada", "Muito obrigado", "Valeu", "Agradeço a ajuda", "Obrigado pela ajuda",
+    "Tchau", "Até logo", "Até mais", "Falou", "Até a próxima",
+    "Quem é você?", "O que você faz?", "Como você pode me ajudar?", "Qual é o seu nome?",
+    "Ok", "Entendi", "Perfeito", "Beleza", "Certo", "Legal",
+    "Hello", "Hi", "Thanks", "Thank you", "Bye",
+]
+
+# Checkpointer Configuration (threads mantidas em memória)
+CHECKPOINT_MAX_THREADS = 1024
+# Mensagens mais recentes mantidas no histórico de cada thread (e enviadas ao gerador de SQL)
+CONVERSATION_HISTORY_MAX_MESSAGES = 20
+
+# Test Questions (requisitos_do_agente.md), executadas com `python agent.py --test`
+TEST_QUESTIONS = [
+    "Quantos chamados foram abertos no dia 28/11/2024?",
+    "Qual o subtipo de chamado (subtipo) mais comum relacionado a \"Iluminação Pública\"?",
+    "Quais os 3 bairros que mais tiveram chamados abertos sobre \"reparo de buraco\" em 2023?",
+    "Qual o nome da unidade organizacional (nome_unidade_organizacional) que mais atendeu chamados de \"Fiscalização de estacionamento irregular\"?",
+    "Olá, tudo bem?",
+    "Me dê sugestões de brincadeiras para fazer com meu cachorro!",
+]
+TEST_CONCURRENCY = 4
 
 # Warning Suppression
 SUPPRESS_WARNINGS = True
 
+# Logging Configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Startup Diagnostics (contagem de embeddings por coleção)
+VERBOSE_STARTUP = False
+
+@lru_cache(maxsize=None)
+def _read_schema(file_path):
+    """Lê o arquivo de schema uma única vez por processo (falhas não são memoizadas)"""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
 def load_schema(schema_name):
     """Carrega o conteúdo de um arquivo de schema"""
     file_path = SCHEMA_FILES.get(schema_name)
@@ -46,8 +139,7 @@ def load_schema(schema_name):
         return f"Schema {schema_name} não encontrado"
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        return _read_schema(file_path)
     except FileNotFoundError:
         return f"Arquivo de schema {file_path} não encontrado"
     except Exception as e:
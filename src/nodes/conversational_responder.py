@@ -1,49 +1,50 @@
 """
-Conversational Respon            json={
-                "model": OPENAI_MODEL,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.3
-            }de - Responde perguntas conversacionais
+Conversational Responder Node - Responde perguntas conversacionais
 """
 
-import json
-import requests
-from src.config.settings import OPENAI_BASE_URL, OPENAI_MODEL, get_openai_api_key
-from src.config.prompts import CONVERSATIONAL_PROMPT
+from src.config.settings import OPENAI_CHAT_MODEL, OPENAI_CHAT_TEMPERATURE, get_openai_api_key
+from src.utils.openai_stream import stream_chat_completion
+from src.config.prompts import CONVERSATIONAL_TEMPLATE, canned_response
 
-def conversational_responder_node(state):
+async def conversational_responder_node(state):
     """
     Nó para respostas conversacionais (saudações, agradecimentos, etc.)
     """
     question = state.get("question", "")
     
-    prompt = CONVERSATIONAL_PROMPT.format(question=question)
+    # Saudações e agradecimentos triviais: resposta pronta, sem chamada à API
+    canned = canned_response(question)
+    if canned is not None:
+        return {
+            "final_response": canned,
+            "messages": [{"role": "assistant", "content": canned}]
+        }
+    
+    prompt = CONVERSATIONAL_TEMPLATE(question=question)
     
     try:
         api_key = get_openai_api_key()
         
-        response = requests.post(
-            f"{OPENAI_BASE_URL}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": OPENAI_MODEL,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 1
-            }
-        )
+        # Streaming: cada trecho é repassado ao stream "custom" do grafo
+        status_code, content = await stream_chat_completion(api_key, {
+            "model": OPENAI_CHAT_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": OPENAI_CHAT_TEMPERATURE
+        })
         
-        if response.status_code == 200:
-            result = response.json()
-            final_response = result["choices"][0]["message"]["content"].strip()
-        else:
+        if status_code != 200:
+            # Resposta genérica de contingência: "error" impede que ela vá para o cache
             final_response = f"Olá! Sou o assistente de análise de dados da Prefeitura do Rio de Janeiro. Como posso ajudá-lo?"
+            return {
+                "final_response": final_response,
+                "error": f"Erro na API: {status_code}",
+                "messages": [{"role": "assistant", "content": final_response}]
+            }
         
+        final_response = content.strip()
         return {
             "final_response": final_response,
-            "messages": state.get("messages", []) + [{
+            "messages": [{
                 "role": "assistant", 
                 "content": final_response
             }]
@@ -53,7 +54,8 @@ def conversational_responder_node(state):
         fallback_response = "Olá! Sou o assistente de análise de dados da Prefeitura do Rio de Janeiro. Como posso ajudá-lo com informações sobre os serviços municipais?"
         return {
             "final_response": fallback_response,
-            "messages": state.get("messages", []) + [{
+            "error": f"Erro na resposta conversacional: {str(e)}",
+            "messages": [{
                 "role": "assistant", 
                 "content": fallback_response
             }]
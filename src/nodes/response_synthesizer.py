@@ -1,17 +1,14 @@
 """
-Response Synthesizer Node - Converte dados de con            json={
-                "model": OPENAI_MODEL,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.1
-            }em resposta natural
+Response Synthesizer Node - Converte dados de consulta em resposta natural
 """
 
 import json
-import requests
-from src.config.settings import OPENAI_BASE_URL, OPENAI_MODEL, get_openai_api_key
-from src.config.prompts import RESPONSE_SYNTHESIZER_PROMPT
+from src.config.settings import OPENAI_MODEL, SYNTHESIZER_MAX_ROWS, SYNTHESIZER_MAX_CHARS, get_openai_api_key
+from src.utils.openai_stream import stream_chat_completion
+from src.config.prompts import RESPONSE_SYNTHESIZER_TEMPLATE
+from src.utils.llm_cache import get_llm_cache
 
-def response_synthesizer_node(state):
+async def response_synthesizer_node(state):
     """
     Nó sintetizador: converte dados em resposta natural
     """
@@ -34,44 +31,55 @@ def response_synthesizer_node(state):
         if data_result and len(data_result) > 0:
             # Criar resumo dos dados
             data_summary = f"Dados encontrados ({len(data_result)} linhas):\n"
-            if len(data_result) <= 10:
-                data_summary += str(data_result)
-            else:
-                data_summary += str(data_result[:10])
-                data_summary += f"\n... e mais {len(data_result) - 10} linhas"
+            # JSON compacto e limitado em caracteres para não inflar o prompt
+            data_summary += json.dumps(
+                data_result[:SYNTHESIZER_MAX_ROWS], ensure_ascii=False, separators=(",", ":"), default=str
+            )[:SYNTHESIZER_MAX_CHARS]
+            if len(data_result) > SYNTHESIZER_MAX_ROWS:
+                data_summary += f"\n... e mais {len(data_result) - SYNTHESIZER_MAX_ROWS} linhas"
         else:
             data_summary = "Nenhum resultado encontrado."
         
-        prompt = RESPONSE_SYNTHESIZER_PROMPT.format(
+        prompt = RESPONSE_SYNTHESIZER_TEMPLATE(
             data_result=data_summary,
             question=question
         )
     
     try:
+        # Mesma pergunta com os mesmos dados: reaproveitar a síntese anterior
+        llm_cache = get_llm_cache()
+        cached = None if error else llm_cache.lookup(prompt, OPENAI_MODEL)
+        if cached is not None:
+            return {
+                "final_response": cached,
+                "messages": [{"role": "assistant", "content": cached}]
+            }
+        
         api_key = get_openai_api_key()
         
-        response = requests.post(
-            f"{OPENAI_BASE_URL}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": OPENAI_MODEL,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 1
+        # Streaming: cada trecho é repassado ao stream "custom" do grafo
+        status_code, content = await stream_chat_completion(api_key, {
+            "model": OPENAI_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 1
+        })
+        
+        if status_code != 200:
+            # "error" marca a resposta como falha: o agente não a guarda em cache
+            final_response = f"Erro ao gerar resposta: {status_code}"
+            return {
+                "final_response": final_response,
+                "error": error or final_response,
+                "messages": [{"role": "assistant", "content": final_response}]
             }
-        )
         
-        if response.status_code == 200:
-            result = response.json()
-            final_response = result["choices"][0]["message"]["content"].strip()
-        else:
-            final_response = f"Erro ao gerar resposta: {response.status_code}"
+        final_response = content.strip()
+        if not error:
+            llm_cache.update(prompt, OPENAI_MODEL, final_response)
         
         return {
             "final_response": final_response,
-            "messages": state.get("messages", []) + [{
+            "messages": [{
                 "role": "assistant", 
                 "content": final_response
             }]
@@ -81,7 +89,8 @@ def response_synthesizer_node(state):
         error_response = f"Erro ao sintetizar resposta: {str(e)}"
         return {
             "final_response": error_response,
-            "messages": state.get("messages", []) + [{
+            "error": error or error_response,
+            "messages": [{
                 "role": "assistant", 
                 "content": error_response
             }]
@@ -1,48 +1,150 @@
 """
 Router Node - Determina se a pergunta requer consulta a dados ou resposta conversacional
+Em perguntas conversacionais já devolve a resposta final na mesma chamada
 """
 
+import logging
 import json
-import requests
-from src.config.settings import OPENAI_BASE_URL, OPENAI_MODEL, get_openai_api_key
-from src.config.prompts import ROUTER_PROMPT
+import re
+import asyncio
+from typing import Literal, Optional
+from pydantic import BaseModel, ValidationError
+from src.config.settings import OPENAI_ROUTER_MODEL, SPECULATIVE_SQL_PLANNING
+from src.config.prompts import ROUTER_TEMPLATE, GREETING_RE
+from src.nodes.sql_generator import plan_sql
+from src.utils.http_client import json_loads, post_chat_completion
+from src.utils.llm_cache import get_llm_cache
 
-def router_node(state):
+logger = logging.getLogger(__name__)
+
+# Pré-filtro léxico: perguntas óbvias são roteadas sem embedding nem chamada ao LLM.
+# Dados exigem um marcador analítico E um termo do domínio dos chamados, evitando
+# desviar perguntas gerais como "qual a diferença entre X e Y?"
+_DATA_MARKER_RE = re.compile(
+    r"\b(?:quant[oa]s?|média|total|top\s+\d+|list(?:e|ar)|agrupar|desde|entre|por (?:bairro|tipo|subtipo|ano|mês))\b",
+    re.IGNORECASE
+)
+_DATA_DOMAIN_RE = re.compile(
+    r"\b(?:chamad[oa]s?|1746|reclamaç(?:ão|ões)|subtipos?|bairros?|unidades? organizaciona(?:l|is))\b",
+    re.IGNORECASE
+)
+
+def _prefilter(question) -> Optional[str]:
+    """Rota decidida por expressões regulares, ou None quando a pergunta é ambígua"""
+    if GREETING_RE.match(question):
+        return "conversational"
+    if _DATA_MARKER_RE.search(question) and _DATA_DOMAIN_RE.search(question):
+        return "data_query"
+    return None
+
+class RouteDecision(BaseModel):
+    """Saída estruturada do router"""
+    intent: Literal["data_query", "conversational"]
+    conversational_answer: Optional[str] = None
+    sql_hint: Optional[str] = None
+
+async def _classify(question):
+    """Chama o modelo do router e devolve (status_code, decisão validada ou None)"""
+    prompt = ROUTER_TEMPLATE(question=question)
+    
+    # Chamada determinística (temperature=0): o mesmo prompt sempre leva à mesma decisão
+    llm_cache = get_llm_cache()
+    cached = llm_cache.lookup(prompt, OPENAI_ROUTER_MODEL)
+    if cached is not None:
+        return 200, RouteDecision.model_validate_json(cached)
+    
+    response = await post_chat_completion({
+        "model": OPENAI_ROUTER_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "response_format": {"type": "json_object"},
+        "temperature": 0
+    })
+    
+    if response.status_code != 200:
+        return response.status_code, None
+    content = json_loads(response.content)["choices"][0]["message"]["content"]
+    # Validar antes de armazenar: uma resposta malformada não pode ficar em cache
+    decision = RouteDecision.model_validate_json(content)
+    llm_cache.update(prompt, OPENAI_ROUTER_MODEL, content)
+    return response.status_code, decision
+
+async def _await_plan(task):
+    """Resultado do planejamento especulativo (None se desabilitado ou com falha)"""
+    if task is None:
+        return None
+    try:
+        _, sql_plan = await task
+        return sql_plan
+    except Exception as e:
+        logger.warning("⚠️ Planejamento especulativo do SQL falhou: %s", e)
+        return None
+
+async def _discard(task):
+    """Cancela o planejamento especulativo quando a rota não é de dados"""
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+
+async def router_node(state):
     """
     Nó roteador que decide se a pergunta requer consulta a dados ou é conversacional
+    
+    Perguntas óbvias são decididas pelo pré-filtro léxico, sem chamar o LLM; só as
+    perguntas ambíguas seguem para o prompt do router.
+    Em paralelo à classificação, dispara a primeira chamada do gerador de SQL,
+    sobrepondo as duas idas à API quando a pergunta é de dados.
     """
     question = state.get("question", "")
+    messages = state.get("messages", [])
+    
+    intent = _prefilter(question)
+    if intent == "data_query":
+        return {"route": "data_query", "sql_hint": None, "sql_plan": None}
+    if intent == "conversational":
+        return {"route": "conversational"}
     
-    prompt = ROUTER_PROMPT.format(question=question)
+    plan_task = None
+    if SPECULATIVE_SQL_PLANNING:
+        plan_task = asyncio.ensure_future(plan_sql(question, messages))
     
     try:
-        api_key = get_openai_api_key()
+        status_code, decision = await _classify(question)
         
-        response = requests.post(
-            f"{OPENAI_BASE_URL}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": OPENAI_MODEL,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 1
+        if decision is None:
+            logger.error("Erro na API OpenAI: %s", status_code)
+            await _discard(plan_task)
+            return {"route": "conversational", "error": f"Erro na API do router: {status_code}"}
+        
+        if decision.intent == "data_query":
+            # Plano especulativo só é aproveitado se a chamada teve sucesso
+            sql_plan = await _await_plan(plan_task)
+            return {"route": "data_query", "sql_hint": decision.sql_hint, "sql_plan": sql_plan}
+        
+        await _discard(plan_task)
+        
+        # Resposta conversacional pronta: encerra o grafo sem nova chamada ao LLM
+        if decision.conversational_answer:
+            final_response = decision.conversational_answer.strip()
+            return {
+                "route": "conversational",
+                "final_response": final_response,
+                "messages": [{
+                    "role": "assistant",
+                    "content": final_response
+                }]
             }
-        )
         
-        if response.status_code == 200:
-            result = response.json()
-            decision = result["choices"][0]["message"]["content"].strip().lower()
-            
-            if "data_query" in decision:
-                return {"route": "data_query"}
-            else:
-                return {"route": "conversational"}
-        else:
-            print(f"Erro na API OpenAI: {response.status_code}")
-            return {"route": "conversational"}
-            
+        return {"route": "conversational"}
+    
+    except (ValidationError, json.JSONDecodeError, KeyError) as e:
+        logger.error("Erro ao interpretar decisão do router: %s", e)
+        await _discard(plan_task)
+        return {"route": "conversational", "error": f"Decisão do router inválida: {e}"}
     except Exception as e:
-        print(f"Erro no router: {e}")
-        return {"route": "conversational"}
\ No newline at end of file
+        logger.error("Erro no router: %s", e)
+        await _discard(plan_task)
+        return {"route": "conversational", "error": f"Erro no router: {e}"}
@@ -2,52 +2,187 @@
 SQL Executor Node - Executa consultas SQL no BigQuery
 """
 
-from google.cloud import bigquery
-from src.config.settings import get_google_credentials
+import logging
+import asyncio
+import threading
+from functools import lru_cache
+from cachetools import TTLCache
+from src.config.settings import (
+    get_google_credentials, RESULT_CACHE_MAX_SIZE, RESULT_CACHE_TTL_SECONDS, BIGQUERY_MAX_BYTES_BILLED,
+    BIGQUERY_STORAGE_MIN_ROWS, BIGQUERY_PENDING_JOBS_MAX_SIZE, BIGQUERY_PENDING_JOBS_TTL_SECONDS
+)
 
-def sql_executor_node(state):
+logger = logging.getLogger(__name__)
+
+# Resultados recentes por SQL (TTL limita a defasagem em relação ao BigQuery)
+_SQL_RESULT_CACHE = TTLCache(maxsize=RESULT_CACHE_MAX_SIZE, ttl=RESULT_CACHE_TTL_SECONDS)
+_SQL_RESULT_CACHE_LOCK = threading.Lock()
+
+# Jobs submetidos pelo sql_generator aguardando o executor, por job_id
+# (QueryJob não é serializável, por isso não trafega no estado do grafo).
+# Limitado por TTL: jobs de execuções interrompidas antes do executor não se acumulam
+_PENDING_JOBS = TTLCache(maxsize=BIGQUERY_PENDING_JOBS_MAX_SIZE, ttl=BIGQUERY_PENDING_JOBS_TTL_SECONDS)
+_PENDING_JOBS_LOCK = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _credentials():
+    """Credenciais da service account: chave lida e signer criado uma única vez"""
+    from google.oauth2 import service_account
+    
+    return service_account.Credentials.from_service_account_file(
+        get_google_credentials(),
+        scopes=["https://www.googleapis.com/auth/cloud-platform"]
+    )
+
+@lru_cache(maxsize=1)
+def _bq_client():
+    """Cliente BigQuery do processo: canal HTTP criado uma única vez"""
+    # Import tardio: o cliente BigQuery só é carregado quando há consulta a dados
+    from google.cloud import bigquery
+    
+    credentials = _credentials()
+    return bigquery.Client(credentials=credentials, project=credentials.project_id)
+
+@lru_cache(maxsize=1)
+def _bqstorage_client():
+    """Cliente da Storage Read API (gRPC), com as mesmas credenciais do cliente BigQuery"""
+    from google.cloud import bigquery_storage
+    
+    return bigquery_storage.BigQueryReadClient(credentials=_credentials())
+
+def _start_query(bigquery_client, sql_query):
+    """Valida a consulta com dry-run e submete o job com limite de bytes faturados"""
+    from google.cloud import bigquery
+    
+    dry_run_job = bigquery_client.query(
+        sql_query,
+        job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    )
+    if dry_run_job.total_bytes_processed > BIGQUERY_MAX_BYTES_BILLED:
+        raise ValueError(
+            f"Consulta processaria {dry_run_job.total_bytes_processed:,} bytes "
+            f"(limite: {BIGQUERY_MAX_BYTES_BILLED:,}). Adicione filtros, especialmente de data."
+        )
+    
+    return bigquery_client.query(
+        sql_query,
+        job_config=bigquery.QueryJobConfig(
+            use_query_cache=True,
+            maximum_bytes_billed=BIGQUERY_MAX_BYTES_BILLED
+        )
+    )
+
+def submit_query(sql_query):
+    """Submete a consulta ao BigQuery sem aguardar o resultado e retorna o job_id"""
+    query_job = _start_query(_bq_client(), sql_query)
+    with _PENDING_JOBS_LOCK:
+        _PENDING_JOBS[query_job.job_id] = query_job
+    return query_job.job_id
+
+def is_result_cached(sql_query):
+    """Indica se o resultado desta SQL ainda está no cache"""
+    with _SQL_RESULT_CACHE_LOCK:
+        return sql_query in _SQL_RESULT_CACHE
+
+def _pop_pending_job(job_id):
+    """Remove e retorna o job pendente, se existir"""
+    if not job_id:
+        return None
+    with _PENDING_JOBS_LOCK:
+        return _PENDING_JOBS.pop(job_id, None)
+
+async def _cancel_job(query_job):
+    """Cancela um job cujo resultado não será lido (melhor esforço)"""
+    if query_job is None:
+        return
+    try:
+        await asyncio.to_thread(query_job.cancel)
+    except Exception as e:
+        logger.warning("⚠️ Não foi possível cancelar o job %s: %s", query_job.job_id, e)
+
+async def sql_executor_node(state):
     """
     Nó executor de SQL: executa a consulta no BigQuery
     """
     sql_query = state.get("sql_query")
+    # Retirar o job submetido pelo gerador em todos os caminhos: se não for lido, é cancelado
+    query_job = _pop_pending_job(state.get("query_job_id"))
     
     if not sql_query or sql_query.strip() == "":
-        print("❌ ERRO: SQL query está vazia!")
+        logger.error("❌ ERRO: SQL query está vazia!")
+        await _cancel_job(query_job)
         return {
             "error": "SQL query vazia ou inválida",
             "data_result": []
         }
     
+    with _SQL_RESULT_CACHE_LOCK:
+        cached_rows = _SQL_RESULT_CACHE.get(sql_query)
+    if cached_rows is not None:
+        logger.info("⚡ Resultado obtido do cache. %d linhas.", len(cached_rows))
+        await _cancel_job(query_job)
+        return {
+            "data_result": cached_rows,
+            "messages": [{
+                "role": "system",
+                "content": f"Resultado obtido do cache. {len(cached_rows)} linhas retornadas."
+            }]
+        }
+    
     try:
-        # Inicializar cliente BigQuery usando service account file
-        credentials_path = get_google_credentials()  # Valida que existe
-        bigquery_client = bigquery.Client.from_service_account_json(credentials_path)
+        logger.info("🔍 Executando SQL:\n%s", sql_query)
         
-        # Executar consulta
-        print(f"🔍 Executando SQL:\n{sql_query}")
-        results = bigquery_client.query(sql_query)
+        # Cliente BigQuery é síncrono: aguardar fora do event loop
+        if query_job is not None:
+            rows = await asyncio.to_thread(_fetch_rows, query_job)
+        else:
+            rows = await asyncio.to_thread(_run_query, sql_query)
+        logger.info("✅ Consulta executada com sucesso. %d linhas retornadas.", len(rows))
         
-        # Converter para lista de dicionários
-        df = results.to_dataframe().to_dict(orient="records")
-        print(f"✅ Consulta executada com sucesso. {len(df)} linhas retornadas.")
+        with _SQL_RESULT_CACHE_LOCK:
+            _SQL_RESULT_CACHE[sql_query] = rows
         
         return {
-            "data_result": df,
-            "messages": state.get("messages", []) + [{
+            "data_result": rows,
+            "messages": [{
                 "role": "system", 
-                "content": f"Consulta executada com sucesso. {len(df)} linhas retornadas."
+                "content": f"Consulta executada com sucesso. {len(rows)} linhas retornadas."
             }]
         }
             
     except Exception as e:
         error_msg = f"Erro ao executar SQL: {str(e)}"
-        print(f"❌ {error_msg}")
+        logger.error("❌ %s", error_msg)
+        await _cancel_job(query_job)
         
         return {
             "error": error_msg,
             "data_result": [],
-            "messages": state.get("messages", []) + [{
+            "messages": [{
                 "role": "system", 
                 "content": error_msg
             }]
-        }
\ No newline at end of file
+        }
+
+def _run_query(sql_query):
+    """Executa a consulta e retorna as linhas como lista de dicionários"""
+    return _fetch_rows(_start_query(_bq_client(), sql_query))
+
+def _fetch_rows(query_job):
+    """Aguarda o job e converte as linhas diretamente para lista de dicionários"""
+    from google.api_core.exceptions import GoogleAPICallError
+    
+    rows = query_job.result()
+    
+    # Resultados grandes: Storage Read API com Arrow (colunar) em vez de paginação JSON via REST
+    if rows.total_rows is not None and rows.total_rows >= BIGQUERY_STORAGE_MIN_ROWS:
+        try:
+            return rows.to_arrow(bqstorage_client=_bqstorage_client()).to_pylist()
+        except (ImportError, GoogleAPICallError) as e:
+            # Sem o pacote ou sem permissão (ex: bigquery.readsessions.create): paginação REST
+            logger.warning("⚠️ BigQuery Storage indisponível, usando REST: %s", e)
+            rows = query_job.result()
+    
+    # Nomes das colunas resolvidos uma vez; cada Row vira dict direto dos seus valores
+    names = [field.name for field in rows.schema]
+    return [dict(zip(names, row.values())) for row in rows]
\ No newline at end of file
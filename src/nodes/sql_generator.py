@@ -2,182 +2,194 @@
 SQL Generator Node - Gera consultas SQL baseadas na pergunta do usuário
 """
 
+import logging
+import re
 import json
-import requests
-from src.config.settings import OPENAI_BASE_URL, OPENAI_MODEL, get_openai_api_key, load_schema
-from src.config.prompts import SQL_GENERATOR_SYSTEM_PROMPT, TOOL_CONTEXT_PROMPT
-from src.tools.category_tools import (
-    get_nome_unidade_organizacional,
-    get_id_unidade_organizacional_mae,
-    get_tipo,
-    get_subtipo
+import asyncio
+from functools import lru_cache
+from src.config.settings import OPENAI_MODEL, get_openai_api_key, load_schema
+from src.config.prompts import (
+    SQL_GENERATOR_SYSTEM_PROMPT, CONVERSATION_CONTEXT_TEMPLATE
 )
+from src.tools.category_tools import CATEGORY_LABELS, search_categories
+from src.nodes.sql_executor import submit_query, is_result_cached
+from src.utils.http_client import json_loads, post_chat_completion
+from src.utils.openai_stream import stream_chat_completion
 
-def sql_generator_node(state):
-    """
-    Nó gerador de SQL que cria consultas baseadas na pergunta
-    """
-    question = state.get("question", "")
-    messages = state.get("messages", [])
-    
-    # Carrega schemas
-    schema_chamado = load_schema("chamado")
-    schema_bairro = load_schema("bairro")
-    
-    # Define as tools disponíveis
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "get_nome_unidade_organizacional",
-                "description": "Busca nomes de unidades organizacionais similares ao termo fornecido",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {"type": "string", "description": "Termo para buscar unidades organizacionais similares"}
-                    },
-                    "required": ["query"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_id_unidade_organizacional_mae",
-                "description": "Busca IDs de unidades organizacionais mãe similares ao termo fornecido",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {"type": "string", "description": "Termo para buscar unidades mãe similares"}
-                    },
-                    "required": ["query"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_tipo",
-                "description": "Busca tipos de chamados similares ao termo fornecido",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {"type": "string", "description": "Termo para buscar tipos similares"}
-                    },
-                    "required": ["query"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_subtipo",
-                "description": "Busca subtipos de chamados similares ao termo fornecido",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {"type": "string", "description": "Termo para buscar subtipos similares"}
+logger = logging.getLogger(__name__)
+
+# Definição das tools no formato da API OpenAI (constante entre chamadas)
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_category_matches",
+            "description": "Busca valores de uma coluna categórica similares ao termo fornecido",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "category": {
+                        "type": "string",
+                        "enum": list(CATEGORY_LABELS),
+                        "description": "Coluna categórica a consultar"
                     },
-                    "required": ["query"]
-                }
+                    "query": {"type": "string", "description": "Termo para buscar valores similares"}
+                },
+                "required": ["category", "query"]
             }
         }
-    ]
+    }
+]
+
+# Padrões de extração do SQL na resposta do modelo (compilados uma única vez)
+_SQL_HEADER_RE = re.compile(r"^[ \t]*SQL[ \t]*:", re.IGNORECASE | re.MULTILINE)
+_SQL_START_RE = re.compile(r"^[ \t]*WITH\b|\bSELECT\b", re.IGNORECASE | re.MULTILINE)
+_STOP_RE = re.compile(r"^[ \t]*(?:REASONING|EXPLANATION|NOTE)[ \t]*:", re.IGNORECASE | re.MULTILINE)
+_FENCE_RE = re.compile(r"^```(?:sql)?\s*|\s*```$", re.IGNORECASE)
+_OPENING_FENCE_RE = re.compile(r"\s*```")
+
+@lru_cache(maxsize=1)
+def _system_prompt():
+    """Lê os schemas e formata o prompt de sistema estático uma única vez por processo"""
+    return SQL_GENERATOR_SYSTEM_PROMPT.format(
+        schema_chamado=load_schema("chamado"),
+        schema_bairro=load_schema("bairro")
+    )
+
+# Tools conhecidas por nome: cada uma converte os argumentos em (categoria, termo) para a busca em lote.
+# Os nomes das antigas tools por coluna continuam aceitos e apontam para a categoria correspondente.
+_TOOL_DISPATCH = {
+    "get_category_matches": lambda args: (args.get("category", ""), args.get("query", "")),
+    **{
+        f"get_{category}": (lambda category: lambda args: (category, args.get("query", "")))(category)
+        for category in CATEGORY_LABELS
+    }
+}
+
+async def _run_tools(tool_calls):
+    """Executa as tool calls em lote (um request de embeddings) fora do event loop"""
+    outputs = [None] * len(tool_calls)
+    calls = []
+    positions = []
+    for i, tool_call in enumerate(tool_calls):
+        function_name = tool_call["function"]["name"]
+        to_call = _TOOL_DISPATCH.get(function_name)
+        try:
+            function_args = json.loads(tool_call["function"]["arguments"] or "{}")
+        except json.JSONDecodeError:
+            to_call = None
+        if to_call is None:
+            outputs[i] = f"{function_name}: Tool não encontrada ou argumentos inválidos"
+            continue
+        calls.append(to_call(function_args))
+        positions.append(i)
     
-    # Monta o prompt inicial
-    agent_scratchpad = ""
+    # Chamadas repetidas (mesma categoria e termo, inclusive via nomes antigos) executam uma vez só
+    unique_calls = list(dict.fromkeys((category, query.strip()) for category, query in calls))
+    if unique_calls:
+        results = dict(zip(unique_calls, await asyncio.to_thread(search_categories, unique_calls)))
+        for i, (category, query) in zip(positions, calls):
+            query = query.strip()
+            outputs[i] = f"get_category_matches('{category}', '{query}'): {results[(category, query)]}"
+    return outputs
+
+def _user_content(question, sql_hint):
+    """Pergunta acompanhada da dica do router (filtros/agregações), se houver"""
+    return f"{question}\n\nDica: {sql_hint}" if sql_hint else question
+
+def _build_planning_messages(messages, user_content):
+    """Prefixo estático (cacheável pelo provedor), histórico da conversa e pergunta"""
+    planning_messages = [{"role": "system", "content": _system_prompt()}]
     if messages:
-        agent_scratchpad = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+        history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+        planning_messages.append({"role": "system", "content": CONVERSATION_CONTEXT_TEMPLATE(history=history)})
+    planning_messages.append({"role": "user", "content": user_content})
+    return planning_messages
+
+def _follow_up_messages(messages, user_content, message, tool_results):
+    """Conversa da primeira chamada seguida da resposta com tool calls e de uma mensagem "tool" por chamada"""
+    tool_calls = message["tool_calls"]
+    follow_up = _build_planning_messages(messages, user_content)
+    follow_up.append({"role": "assistant", "content": message.get("content"), "tool_calls": tool_calls})
+    seen = set()
+    for tool_call, result in zip(tool_calls, tool_results):
+        # A API exige uma resposta por tool_call_id; resultados repetidos não são reenviados
+        content = result if result not in seen else "Mesmo resultado de uma chamada anterior."
+        seen.add(result)
+        follow_up.append({"role": "tool", "tool_call_id": tool_call["id"], "content": content})
+    return follow_up
+
+async def plan_sql(question, messages, sql_hint=None):
+    """
+    Primeira chamada ao LLM: decide quais tools usar (ou já devolve o SQL)
     
-    system_prompt = SQL_GENERATOR_SYSTEM_PROMPT.format(
-        schema_chamado=schema_chamado,
-        schema_bairro=schema_bairro,
-        agent_scratchpad=agent_scratchpad
-    )
+    Retorna (status_code, message). Pode ser disparada em paralelo ao router,
+    pois não depende da decisão de rota.
+    """
+    initial_messages = _build_planning_messages(messages, _user_content(question, sql_hint))
+    
+    response = await post_chat_completion({
+        "model": OPENAI_MODEL,
+        "messages": initial_messages,
+        "tools": TOOLS,
+        "tool_choice": "auto",
+        "temperature": 1
+    })
+    
+    if response.status_code != 200:
+        return response.status_code, None
+    return response.status_code, json_loads(response.content)["choices"][0]["message"]
+
+async def sql_generator_node(state):
+    """
+    Nó gerador de SQL que cria consultas baseadas na pergunta
+    """
+    question = state.get("question", "")
+    messages = state.get("messages", [])
     
     try:
-        api_key = get_openai_api_key()
+        sql_hint = state.get("sql_hint")
         
-        # Primeira chamada para identificar se precisa usar tools
-        initial_messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": question}
-        ]
-        
-        response = requests.post(
-            f"{OPENAI_BASE_URL}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": OPENAI_MODEL,
-                "messages": initial_messages,
-                "tools": tools,
-                "tool_choice": "auto",
-                "temperature": 1
-            }
-        )
-        
-        if response.status_code != 200:
-            return {"sql_query": None, "error": f"Erro na API: {response.status_code}"}
-        
-        result = response.json()
-        message = result["choices"][0]["message"]
+        # Primeira chamada: reaproveita o plano especulativo do router (feito sem a dica), se houver
+        message = state.get("sql_plan")
+        if message is not None and sql_hint and not message.get("tool_calls"):
+            # O plano já traz o SQL final, gerado sem a dica: refazer a chamada com ela
+            message = None
+        planned_hint = None
+        if message is None:
+            planned_hint = sql_hint
+            status_code, message = await plan_sql(question, messages, sql_hint)
+            if message is None:
+                return {"sql_query": None, "error": f"Erro na API: {status_code}"}
         
         # Verifica se há tool calls
         tool_context = ""
         if "tool_calls" in message and message["tool_calls"]:
-            tool_results = []
-            
-            for tool_call in message["tool_calls"]:
-                function_name = tool_call["function"]["name"]
-                function_args = json.loads(tool_call["function"]["arguments"])
-                
-                # Executa a tool correspondente
-                if function_name == "get_nome_unidade_organizacional":
-                    result_tool = get_nome_unidade_organizacional(function_args["query"])
-                elif function_name == "get_id_unidade_organizacional_mae":
-                    result_tool = get_id_unidade_organizacional_mae(function_args["query"])
-                elif function_name == "get_tipo":
-                    result_tool = get_tipo(function_args["query"])
-                elif function_name == "get_subtipo":
-                    result_tool = get_subtipo(function_args["query"])
-                else:
-                    result_tool = "Tool não encontrada"
-                
-                tool_results.append(f"{function_name}('{function_args['query']}'): {result_tool}")
+            # Executa todas as tools do turno em lote
+            tool_results = await _run_tools(message["tool_calls"])
             
-            tool_context = "\n".join(tool_results)
+            # Resultados idênticos aparecem uma única vez no contexto
+            tool_context = "\n".join(dict.fromkeys(tool_results))
             
-            # Segunda chamada com contexto das tools
-            tool_prompt = TOOL_CONTEXT_PROMPT.format(
-                tool_context=tool_context,
-                schema_chamado=schema_chamado,
-                schema_bairro=schema_bairro
+            # Segunda chamada: continua a mesma conversa (prefixo idêntico ao da primeira,
+            # aproveitado pelo cache de prompt do provedor) com os resultados como mensagens "tool"
+            final_messages = _follow_up_messages(
+                messages, _user_content(question, planned_hint), message, tool_results
             )
+            if sql_hint and sql_hint != planned_hint:
+                final_messages.append({"role": "user", "content": f"Dica: {sql_hint}"})
             
-            final_messages = [
-                {"role": "system", "content": tool_prompt},
-                {"role": "user", "content": question}
-            ]
-            
-            final_response = requests.post(
-                f"{OPENAI_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": OPENAI_MODEL,
-                    "messages": final_messages,
-                    "temperature": 1
-                }
-            )
+            # Streaming interno (não exibido): encerra assim que o bloco SQL termina
+            status_code, content = await stream_chat_completion(get_openai_api_key(), {
+                "model": OPENAI_MODEL,
+                "messages": final_messages,
+                "tools": TOOLS,
+                "tool_choice": "none",
+                "temperature": 1
+            }, stop=_SqlBlockEnd(), emit=False)
             
-            if final_response.status_code == 200:
-                final_result = final_response.json()
-                sql_content = final_result["choices"][0]["message"]["content"]
+            if status_code == 200:
+                sql_content = content
             else:
                 sql_content = message.get("content", "")
         else:
@@ -186,15 +198,57 @@ def sql_generator_node(state):
         # Extrai apenas o SQL do conteúdo
         sql_query = extract_sql_from_content(sql_content)
         
+        # Submete o job ao BigQuery já aqui; o executor apenas aguarda o resultado
+        query_job_id = None
+        if sql_query and not is_result_cached(sql_query):
+            try:
+                query_job_id = await asyncio.to_thread(submit_query, sql_query)
+            except Exception as e:
+                logger.warning("⚠️ Não foi possível submeter a consulta antecipadamente: %s", e)
+        
         return {
             "sql_query": sql_query,
+            "query_job_id": query_job_id,
             "tool_context": tool_context,
-            "messages": messages + [{"role": "assistant", "content": sql_content}]
+            "messages": [{"role": "assistant", "content": sql_content}]
         }
         
     except Exception as e:
         return {"sql_query": None, "error": f"Erro ao gerar SQL: {str(e)}"}
 
+class _SqlBlockEnd:
+    """
+    Indica se o texto parcial já contém o bloco SQL inteiro (seção seguinte ou ``` fechado)
+    
+    Chamado a cada trecho do streaming: guarda o progresso e examina só a partir do
+    início da última linha incompleta, em vez de reprocessar todo o texto acumulado.
+    """
+    
+    def __init__(self):
+        self._scanned = 0
+        self._body_start = None
+        self._fence_end = None
+    
+    def __call__(self, buffer):
+        # Padrões ancorados em início de linha: a última linha pode ter sido completada agora
+        start = buffer.rfind("\n", 0, self._scanned) + 1
+        self._scanned = len(buffer)
+        
+        if self._body_start is None:
+            header = _SQL_HEADER_RE.search(buffer, start)
+            if header is None:
+                return False
+            self._body_start = start = header.end()
+        if _STOP_RE.search(buffer, max(start, self._body_start)):
+            return True
+        
+        if self._fence_end is None:
+            opening = _OPENING_FENCE_RE.match(buffer, self._body_start)
+            if opening is None:
+                return False
+            self._fence_end = start = opening.end()
+        return buffer.find("```", max(start, self._fence_end)) != -1
+
 def extract_sql_from_content(content):
     """
     Extrai o SQL do conteúdo retornado pelo modelo
@@ -202,39 +256,18 @@ def extract_sql_from_content(content):
     if not content:
         return None
     
-    # Procura por SQL: ou sql: ou similar
-    lines = content.split('\n')
-    sql_lines = []
-    capturing = False
-    
-    for line in lines:
-        if line.strip().upper().startswith('SQL:'):
-            capturing = True
-            sql_part = line.split(':', 1)
-            if len(sql_part) > 1 and sql_part[1].strip():
-                sql_lines.append(sql_part[1].strip())
-            continue
-        elif capturing and line.strip():
-            if line.strip().upper().startswith(('REASONING:', 'EXPLANATION:', 'NOTE:')):
-                break
-            sql_lines.append(line)
-        elif capturing and not line.strip():
-            # Linha vazia pode ser parte do SQL
-            sql_lines.append(line)
-    
-    if sql_lines:
-        return '\n'.join(sql_lines).strip()
-    
-    # Fallback: procura por SELECT
-    if 'SELECT' in content.upper():
-        # Tenta extrair tudo que parece SQL
-        start_idx = content.upper().find('SELECT')
-        if start_idx != -1:
-            sql_part = content[start_idx:]
-            # Remove explicações posteriores
-            for stop_word in ['REASONING:', 'EXPLANATION:', 'NOTE:']:
-                if stop_word in sql_part.upper():
-                    sql_part = sql_part[:sql_part.upper().find(stop_word)]
-            return sql_part.strip()
+    # Bloco após "SQL:" até a próxima seção (REASONING/EXPLANATION/NOTE)
+    match = _SQL_HEADER_RE.search(content)
+    if match is not None:
+        start = match.end()
+    else:
+        # Fallback: a partir do primeiro WITH (início de linha) ou SELECT
+        match = _SQL_START_RE.search(content)
+        if match is None:
+            return content.strip()
+        start = match.start()
     
-    return content.strip()
\ No newline at end of file
+    # Uma busca a partir do início do SQL, sem lookahead a cada caractere
+    stop = _STOP_RE.search(content, start)
+    sql = _FENCE_RE.sub("", content[start:stop.start() if stop else len(content)].strip())
+    return sql or content.strip()
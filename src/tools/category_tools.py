@@ -3,175 +3,209 @@ Tools para busca por similaridade em colunas categóricas
 Utiliza ChromaDB e embeddings OpenAI para encontrar valores similares
 """
 
-import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from dotenv import load_dotenv
-import requests
-import chromadb
-from typing import List, Optional, Dict
+from typing import List, Literal, Optional, Dict, Tuple
 from langchain_core.tools import tool
 from src.config.settings import (
-    OPENAI_BASE_URL, OPENAI_EMBEDDING_MODEL, CHROMA_PERSIST_DIRECTORY,
-    CHROMA_COLLECTIONS, SIMILARITY_THRESHOLD, get_openai_api_key
+    OPENAI_EMBEDDING_MODEL,
+    CHROMA_CATEGORY_COLLECTION, SIMILARITY_THRESHOLD, get_openai_api_key
 )
+from src.utils.openai_client import OpenAIClient
+from src.utils.chroma_singleton import get_collection
+from src.utils.cached_embedder import CachedEmbedder
+from src.utils.flat_store import FlatEmbeddingStore
+from src.utils.cosine import cosine_similarities, top_k_above
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-class OpenAIClient:
-    """Custom OpenAI client using requests"""
-    
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        self.base_url = OPENAI_BASE_URL
-        self.headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-    
-    def create_embeddings(self, texts: List[str], model: str = OPENAI_EMBEDDING_MODEL) -> List[List[float]]:
-        """Create embeddings using OpenAI API"""
-        url = f"{self.base_url}/embeddings"
-        data = {
-            "model": model,
-            "input": texts,
-            "encoding_format": "float"
-        }
-        
-        response = requests.post(url, headers=self.headers, json=data)
-        response.raise_for_status()
-        
-        result = response.json()
-        return [item["embedding"] for item in result["data"]]
+# Thread auxiliar para carregar a coleção em paralelo ao primeiro request de embeddings
+_LOADER = ThreadPoolExecutor(max_workers=1)
+
+def _normalize_query(query: str) -> str:
+    """Normaliza caixa e espaços para que variações triviais compartilhem o embedding"""
+    return " ".join(query.lower().split())
 
 class CategorySearchTools:
     """Tools para busca por similaridade em categorias"""
     
     def __init__(self):
-        self.openai_client = OpenAIClient(api_key=get_openai_api_key())
-        self.chroma_client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIRECTORY)
+        self.openai_client = CachedEmbedder(OpenAIClient(api_key=get_openai_api_key()))
         self.similarity_threshold = SIMILARITY_THRESHOLD
-    
-    def _search_similar(self, collection_name: str, query: str, n_results: int = 5) -> List[Dict]:
-        """Busca valores similares em uma coleção"""
-        try:
-            collection = self.chroma_client.get_collection(collection_name)
-            
-            # Verificar se a coleção tem dados
-            if collection.count() == 0:
-                print(f"⚠️ Coleção {collection_name} está vazia")
-                return []
-            
-            # Criar embedding da query
-            embeddings = self.openai_client.create_embeddings(
-                texts=[query],
-                model=OPENAI_EMBEDDING_MODEL
-            )
-            query_embedding = embeddings[0]
-            
-            # Buscar
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results
+        
+        # Matrizes normalizadas (busca exata por produto escalar) e documentos por categoria
+        self._matrices: Optional[Dict[str, np.ndarray]] = None
+        self._documents: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._loading = None
+    
+    def warm_up(self):
+        """Inicia em segundo plano a carga da coleção (chamado na inicialização do agente)"""
+        with self._lock:
+            if self._loading is None:
+                self._loading = _LOADER.submit(self._load_matrices)
+            return self._loading
+    
+    def _load_matrices(self) -> Dict[str, np.ndarray]:
+        """Carrega a coleção compartilhada e separa os vetores pelo metadado "category" (executado pelo _LOADER)"""
+        # A carga roda fora do lock: buscas e warm_up não esperam por ela, apenas pelo futuro
+        collection = get_collection(CHROMA_CATEGORY_COLLECTION)
+        # Snapshot do inicializador: matrizes prontas, sem converter listas do Chroma.
+        # Só vale se exportado da coleção com o mesmo digest de valores (coleção verificada)
+        values_digest = (collection.metadata or {}).get("values_digest")
+        snapshot = None
+        if values_digest:
+            snapshot = FlatEmbeddingStore().load(values_digest, expected_count=collection.count())
+        if snapshot is None:
+            snapshot = FlatEmbeddingStore.split_by_category(
+                collection.get(include=["embeddings", "documents", "metadatas"])
             )
-            
-            # Filtrar por threshold de similaridade
-            similar_values = []
-            for doc, distance in zip(results['documents'][0], results['distances'][0]):
-                similarity = 1 - distance  # Converter distância cosseno para similaridade
-                if similarity >= self.similarity_threshold:
-                    similar_values.append({
-                        "value": doc,
-                        "similarity": similarity
-                    })
-            
-            return similar_values
-            
+        matrices, documents = snapshot
+        
+        # Publicação: documentos antes das matrizes, que sinalizam a carga concluída
+        with self._lock:
+            self._documents = documents
+            self._matrices = matrices
+        return matrices
+    
+    def _load_matrix(self, category: str):
+        """Matriz e documentos de uma categoria (vazios se a categoria não foi indexada)"""
+        matrices = self._matrices
+        if matrices is None:
+            matrices = self.warm_up().result()
+        matrix = matrices.get(category)
+        if matrix is None:
+            return np.empty((0, 0), dtype=np.float32), []
+        return matrix, self._documents[category]
+    
+    def _embed_many(self, queries: List[str]) -> Dict[str, np.ndarray]:
+        """Um único request de embeddings para todos os termos distintos"""
+        embeddings = self.openai_client.create_embeddings(texts=queries, model=OPENAI_EMBEDDING_MODEL)
+        return dict(zip(queries, embeddings))
+    
+    def _query_category(self, category: str, queries: np.ndarray, n_results: int) -> List[List[Dict]]:
+        """Busca exata dos vetores de consulta na matriz de uma categoria"""
+        matrix, documents = self._load_matrix(category)
+        
+        # Verificar se a categoria tem dados
+        if len(matrix) == 0:
+            logger.warning("⚠️ Categoria %s está vazia", category)
+            return [[] for _ in queries]
+        
+        # Vocabulários pequenos: busca exata (uma multiplicação de matrizes) supera o HNSW
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        similarities = cosine_similarities(queries, matrix)
+        
+        # Filtrar por threshold de similaridade (cosseno = produto escalar) em NumPy
+        return [
+            [
+                {"value": documents[j], "similarity": float(row[j])}
+                for j in top_k_above(row, n_results, self.similarity_threshold)
+            ]
+            for row in similarities
+        ]
+    
+    def search_many(self, pairs: List[Tuple[str, str]], n_results: int = 5) -> List[List[Dict]]:
+        """
+        Busca várias (categoria, termo) de uma vez: um único request de embeddings
+        para os termos distintos e uma consulta por categoria com todos os seus vetores
+        """
+        results: List[List[Dict]] = [[] for _ in pairs]
+        if not pairs:
+            return results
+        
+        # Coleção ainda não carregada: a carga (iniciada aqui ou no warm-up) corre junto com o request de embeddings
+        loading = self.warm_up() if self._matrices is None else None
+        
+        # Criar embeddings das queries distintas (normalizadas para aproveitar o cache)
+        normalized = [_normalize_query(query) for _, query in pairs]
+        try:
+            embedding_by_query = self._embed_many(list(dict.fromkeys(normalized)))
         except Exception as e:
-            print(f"⚠️ Erro na busca em {collection_name}: {e}")
-            return []
+            logger.warning("⚠️ Erro ao criar embeddings das buscas: %s", e)
+            return results
+        
+        if loading is not None:
+            try:
+                loading.result()
+            except Exception as e:
+                logger.warning("⚠️ Erro ao carregar %s: %s", CHROMA_CATEGORY_COLLECTION, e)
+                # Permitir nova tentativa na próxima busca
+                with self._lock:
+                    self._loading = None
+                return results
+        
+        # Agrupar as posições por categoria
+        positions_by_category: Dict[str, List[int]] = {}
+        for i, (category, _) in enumerate(pairs):
+            positions_by_category.setdefault(category, []).append(i)
+        
+        for category, positions in positions_by_category.items():
+            try:
+                queries = np.asarray([embedding_by_query[normalized[i]] for i in positions], dtype=np.float32)
+                for i, matches in zip(positions, self._query_category(category, queries, n_results)):
+                    results[i] = matches
+            except Exception as e:
+                logger.warning("⚠️ Erro na busca em %s: %s", category, e)
+        
+        return results
 
 # Instanciar as tools
 category_tools = CategorySearchTools()
 
-@tool
-def get_nome_unidade_organizacional(query: str) -> str:
-    """
-    Busca nomes de unidades organizacionais similares ao termo fornecido.
-    
-    Args:
-        query: Termo de busca para encontrar unidades organizacionais similares
-        
-    Returns:
-        String com os valores similares encontrados ou mensagem de não encontrado
-    """
-    results = category_tools._search_similar(CHROMA_COLLECTIONS["nome_unidade_organizacional"], query)
-    
-    if not results:
-        return f"Busca por similaridade não disponível para '{query}'. Use padrões LIKE na consulta SQL."
-    
-    similar_values = [f"'{r['value']}' (sim: {r['similarity']:.3f})" for r in results]
-    return f"Unidades organizacionais similares a '{query}': {', '.join(similar_values)}"
+# Rótulo da resposta por coluna categórica
+CATEGORY_LABELS = {
+    "nome_unidade_organizacional": "Unidades organizacionais",
+    "id_unidade_organizacional_mae": "Unidades mãe",
+    "tipo": "Tipos",
+    "subtipo": "Subtipos",
+}
 
-@tool  
-def get_id_unidade_organizacional_mae(query: str) -> str:
-    """
-    Busca unidades organizacionais mãe similares ao termo fornecido.
-    
-    Args:
-        query: Termo de busca para encontrar unidades mãe similares
-        
-    Returns:
-        String com os valores similares encontrados ou mensagem de não encontrado
-    """
-    results = category_tools._search_similar(CHROMA_COLLECTIONS["id_unidade_organizacional_mae"], query)
-    
+def _format_results(label: str, query: str, results: List[Dict]) -> str:
+    """Formata o resultado de uma busca no texto devolvido ao LLM"""
     if not results:
         return f"Busca por similaridade não disponível para '{query}'. Use padrões LIKE na consulta SQL."
     
     similar_values = [f"'{r['value']}' (sim: {r['similarity']:.3f})" for r in results]
-    return f"Unidades mãe similares a '{query}': {', '.join(similar_values)}"
+    return f"{label} similares a '{query}': {', '.join(similar_values)}"
 
-@tool
-def get_tipo(query: str) -> str:
+def search_categories(calls: List[Tuple[str, str]]) -> List[str]:
     """
-    Busca tipos de chamados similares ao termo fornecido.
+    Executa várias buscas (coluna categórica, termo) com um único request de embeddings
     
-    Args:
-        query: Termo de busca para encontrar tipos de chamados similares
-        
-    Returns:
-        String com os valores similares encontrados ou mensagem de não encontrado
+    Usado pelo gerador de SQL quando o modelo pede várias buscas no mesmo turno.
     """
-    results = category_tools._search_similar(CHROMA_COLLECTIONS["tipo"], query)
-    
-    if not results:
-        return f"Busca por similaridade não disponível para '{query}'. Use padrões LIKE na consulta SQL."
-    
-    similar_values = [f"'{r['value']}' (sim: {r['similarity']:.3f})" for r in results]
-    return f"Tipos similares a '{query}': {', '.join(similar_values)}"
+    known = [(i, category, query) for i, (category, query) in enumerate(calls) if category in CATEGORY_LABELS]
+    results = category_tools.search_many(
+        [(category, query) for _, category, query in known]
+    )
+    
+    outputs = ["Categoria não encontrada"] * len(calls)
+    for (i, category, query), result in zip(known, results):
+        outputs[i] = _format_results(CATEGORY_LABELS[category], query, result)
+    return outputs
 
 @tool
-def get_subtipo(query: str) -> str:
+def get_category_matches(
+    category: Literal["nome_unidade_organizacional", "id_unidade_organizacional_mae", "tipo", "subtipo"],
+    query: str
+) -> str:
     """
-    Busca subtipos de chamados similares ao termo fornecido.
+    Busca valores de uma coluna categórica similares ao termo fornecido.
     
     Args:
-        query: Termo de busca para encontrar subtipos de chamados similares
+        category: Coluna categórica (nome_unidade_organizacional, id_unidade_organizacional_mae, tipo ou subtipo)
+        query: Termo de busca para encontrar valores similares
         
     Returns:
         String com os valores similares encontrados ou mensagem de não encontrado
     """
-    results = category_tools._search_similar(CHROMA_COLLECTIONS["subtipo"], query)
-    
-    if not results:
-        return f"Busca por similaridade não disponível para '{query}'. Use padrões LIKE na consulta SQL."
-    
-    similar_values = [f"'{r['value']}' (sim: {r['similarity']:.3f})" for r in results]
-    return f"Subtipos similares a '{query}': {', '.join(similar_values)}"
+    return search_categories([(category, query)])[0]
 
 # Lista de todas as tools disponíveis
-CATEGORY_TOOLS = [
-    get_nome_unidade_organizacional,
-    get_id_unidade_organizacional_mae,
-    get_tipo,
-    get_subtipo
-]
\ No newline at end of file
+CATEGORY_TOOLS = [get_category_matches]
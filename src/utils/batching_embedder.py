@@ -0,0 +1,72 @@
+"""
+Embedder assíncrono com agrupamento de requisições
+Junta perguntas que chegam em uma janela curta em uma única chamada à API de embeddings
+"""
+
+import asyncio
+from typing import List
+from src.config.settings import EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_WAIT_SECONDS
+
+class BatchingEmbedder:
+    """Agrupa chamadas concorrentes de embed() em lotes de até max_batch_size textos"""
+
+    def __init__(self, openai_client, max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+                 max_wait_seconds: float = EMBEDDING_BATCH_MAX_WAIT_SECONDS):
+        self.openai_client = openai_client
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._loop = None
+        self._queue = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        """Cria fila e tarefa de fundo no event loop corrente (recria se o loop mudou)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def embed(self, text: str) -> List[float]:
+        """Retorna o embedding do texto, aguardando o lote em que ele for incluído"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect_batch(self):
+        """Aguarda o primeiro item e agrupa os seguintes até o tamanho ou tempo limite"""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait_seconds
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        """Loop de fundo: um request de embeddings por lote"""
+        while True:
+            batch = await self._collect_batch()
+            texts = [text for text, _ in batch]
+
+            try:
+                # Cliente HTTP é síncrono: executar fora do event loop
+                embeddings = await self._loop.run_in_executor(
+                    None, self.openai_client.create_embeddings, texts
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
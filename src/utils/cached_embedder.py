@@ -0,0 +1,164 @@
+"""
+Cache LRU em memória para embeddings
+Evita chamadas repetidas à API para textos já embedados no processo.
+Opcionalmente persiste os vetores em SQLite para reuso entre processos.
+"""
+
+import logging
+import os
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional
+from src.config.settings import (
+    OPENAI_EMBEDDING_MODEL, OPENAI_EMBEDDING_DIMENSIONS, EMBEDDING_CACHE_MAX_SIZE, EMBEDDING_CACHE_DB_PATH
+)
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_MAX_PARAMS = 900
+
+class CachedEmbedder:
+    """Envolve um cliente de embeddings com cache LRU chaveado por (modelo, texto)"""
+
+    def __init__(self, inner, maxsize: int = EMBEDDING_CACHE_MAX_SIZE,
+                 db_path: Optional[str] = EMBEDDING_CACHE_DB_PATH):
+        self.inner = inner
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = self._open_store(db_path) if db_path else None
+
+    @staticmethod
+    def _open_store(db_path: str):
+        """Abre o armazenamento em disco; em caso de falha o cache fica só em memória"""
+        try:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            conn.commit()
+            return conn
+        except sqlite3.Error as e:
+            logger.warning("⚠️ Cache de embeddings em disco desabilitado: %s", e)
+            return None
+
+    @staticmethod
+    def _disk_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}:{OPENAI_EMBEDDING_DIMENSIONS}:{text}".encode("utf-8")).hexdigest()
+
+    def _load_from_disk(self, model: str, texts: List[str]) -> dict:
+        """Busca no disco os vetores dos textos ausentes da memória"""
+        keys = {self._disk_key(model, text): text for text in texts}
+        key_list = list(keys)
+        found = {}
+        # Consultas em blocos: builds antigos do SQLite limitam a 999 parâmetros por instrução,
+        # e o inicializador consulta colunas inteiras de uma vez
+        for start in range(0, len(key_list), _SQLITE_MAX_PARAMS):
+            chunk = key_list[start:start + _SQLITE_MAX_PARAMS]
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            # frombuffer: vetor somente leitura sobre o próprio blob, sem conversão para lista
+            found.update((keys[key], np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+        return found
+
+    def _save_to_disk(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            [
+                (self._disk_key(model, text), np.asarray(embedding, dtype=np.float32).tobytes())
+                for text, embedding in zip(texts, embeddings)
+            ]
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _compact(embedding) -> np.ndarray:
+        """
+        Cópia float32 própria e somente leitura do vetor
+        
+        Linhas do ndarray de um lote são views: guardá-las manteria o lote inteiro em memória,
+        e chamadores poderiam alterar o vetor em cache com operações in-place.
+        """
+        if isinstance(embedding, np.ndarray) and embedding.base is None and not embedding.flags.writeable:
+            return embedding
+        vector = np.array(embedding, dtype=np.float32)
+        vector.flags.writeable = False
+        return vector
+
+    def _remember(self, model: str, text: str, embedding) -> np.ndarray:
+        """Insere no LRU em memória (chamar com o lock adquirido) e retorna o vetor armazenado"""
+        vector = self._compact(embedding)
+        self._cache[(model, text)] = vector
+        self._cache.move_to_end((model, text))
+        return vector
+
+    def lookup(self, texts: List[str], model: str = OPENAI_EMBEDDING_MODEL) -> dict:
+        """Retorna {texto: embedding} para os textos já presentes em memória ou em disco"""
+        found = {}
+        with self._lock:
+            for text in texts:
+                embedding = self._cache.get((model, text))
+                if embedding is not None:
+                    found[text] = embedding
+            
+            missing = [text for text in dict.fromkeys(texts) if text not in found]
+            if missing and self._conn is not None:
+                found.update(self._load_from_disk(model, missing))
+        return found
+
+    def store(self, texts: List[str], embeddings, model: str = OPENAI_EMBEDDING_MODEL):
+        """Grava embeddings calculados fora do cliente (ex: chamadas assíncronas em lote)"""
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                self._remember(model, text, embedding)
+            if self._conn is not None and len(texts):
+                self._save_to_disk(model, texts, embeddings)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def create_embeddings(self, texts: List[str], model: str = OPENAI_EMBEDDING_MODEL) -> List[np.ndarray]:
+        """Mesma interface do OpenAIClient; só envia à API os textos ausentes do cache"""
+        results = [None] * len(texts)
+        missing = {}
+
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = (model, text)
+                embedding = self._cache.get(key)
+                if embedding is None:
+                    missing.setdefault(text, []).append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    results[i] = embedding
+
+            # Segundo nível: vetores persistidos por execuções anteriores
+            if missing and self._conn is not None:
+                for text, embedding in self._load_from_disk(model, list(missing)).items():
+                    embedding = self._remember(model, text, embedding)
+                    for i in missing.pop(text):
+                        results[i] = embedding
+
+        if missing:
+            missing_texts = list(missing)
+            embeddings = self.inner.create_embeddings(missing_texts, model)
+
+            with self._lock:
+                for text, embedding in zip(missing_texts, embeddings):
+                    embedding = self._remember(model, text, embedding)
+                    for i in missing[text]:
+                        results[i] = embedding
+                if self._conn is not None:
+                    self._save_to_disk(model, missing_texts, embeddings)
+
+        with self._lock:
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+        return results
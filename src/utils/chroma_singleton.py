@@ -0,0 +1,58 @@
+"""
+Singleton do cliente ChromaDB compartilhado por todo o processo
+Evita reabrir o PersistentClient e recarregar segmentos a cada uso.
+Com CHROMA_MODE=server, conecta a um servidor Chroma compartilhado entre workers.
+"""
+
+import os
+import logging
+import threading
+from src.config.settings import (
+    CHROMA_PERSIST_DIRECTORY, CHROMA_MODE, CHROMA_HOST, CHROMA_PORT, SUPPRESS_WARNINGS
+)
+
+_client = None
+_collections = {}
+_lock = threading.Lock()
+
+def _lazy_chromadb():
+    """Importa o chromadb apenas quando o cliente é de fato necessário"""
+    # Telemetria desligada antes do import, em vez de filtrar as mensagens depois
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+    logging.getLogger("chromadb.telemetry").disabled = True
+    if SUPPRESS_WARNINGS:
+        logging.getLogger("chromadb").setLevel(logging.CRITICAL)
+    
+    import chromadb
+    return chromadb
+
+def _create_client():
+    """Cria o cliente conforme o modo: servidor compartilhado ou persistente local"""
+    chromadb = _lazy_chromadb()
+    settings = chromadb.config.Settings(anonymized_telemetry=False)
+    if CHROMA_MODE == "server":
+        return chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT, settings=settings)
+    return chromadb.PersistentClient(path=CHROMA_PERSIST_DIRECTORY, settings=settings)
+
+def get_client():
+    """Retorna o cliente do ChromaDB, criando-o na primeira chamada"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+def get_collection(name):
+    """Retorna o handle de uma coleção, reaproveitando o cache do processo"""
+    collection = _collections.get(name)
+    if collection is None:
+        collection = get_client().get_collection(name)
+        with _lock:
+            _collections[name] = collection
+    return collection
+
+def reset_collection(name):
+    """Remove uma coleção do cache (ex: após ser deletada ou recriada)"""
+    with _lock:
+        _collections.pop(name, None)
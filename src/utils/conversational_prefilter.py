@@ -0,0 +1,48 @@
+"""
+Pré-roteador conversacional baseado em embeddings
+Compara a pergunta com exemplos de saudações/agradecimentos para evitar o grafo completo
+"""
+
+import os
+import hashlib
+import numpy as np
+from typing import List
+from src.config.settings import (
+    OPENAI_EMBEDDING_MODEL, EMBEDDING_SIGNATURE, CHROMA_PERSIST_DIRECTORY,
+    CONVERSATIONAL_EXEMPLARS, CONVERSATIONAL_PREFILTER_THRESHOLD
+)
+
+class ConversationalPrefilter:
+    """Detecta perguntas puramente conversacionais por similaridade com exemplos"""
+    
+    def __init__(self, openai_client, threshold: float = CONVERSATIONAL_PREFILTER_THRESHOLD):
+        self.openai_client = openai_client
+        self.threshold = threshold
+        self.exemplars = self._load_exemplars()
+    
+    def _exemplars_path(self) -> str:
+        """Caminho do .npy, versionado pelo modelo/dimensão e pelo conjunto de exemplos"""
+        digest = hashlib.sha256(
+            "\n".join([EMBEDDING_SIGNATURE] + CONVERSATIONAL_EXEMPLARS).encode("utf-8")
+        ).hexdigest()[:12]
+        return os.path.join(CHROMA_PERSIST_DIRECTORY, f"conversational_exemplars_{digest}.npy")
+    
+    def _load_exemplars(self) -> np.ndarray:
+        """Carrega a matriz de exemplos normalizada, criando os embeddings na primeira vez"""
+        path = self._exemplars_path()
+        if os.path.exists(path):
+            return np.load(path)
+        
+        embeddings = self.openai_client.create_embeddings(CONVERSATIONAL_EXEMPLARS, OPENAI_EMBEDDING_MODEL)
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        
+        os.makedirs(CHROMA_PERSIST_DIRECTORY, exist_ok=True)
+        np.save(path, matrix)
+        return matrix
+    
+    def is_conversational(self, embedding: List[float]) -> bool:
+        """Retorna True se a pergunta é muito similar a algum exemplo conversacional"""
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / np.linalg.norm(query)
+        return float((self.exemplars @ query).max()) > self.threshold
@@ -0,0 +1,24 @@
+"""
+Similaridade cosseno para as matrizes de categorias em memória
+Um único produto de matrizes float32 (sgemm do BLAS) por categoria, seguido da seleção top-k.
+"""
+
+import numpy as np
+
+def cosine_similarities(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Similaridade entre cada consulta e cada linha da matriz (ambas com norma L2 unitária)"""
+    return np.asarray(queries, dtype=np.float32) @ np.asarray(matrix, dtype=np.float32).T
+
+def top_k(similarities: np.ndarray, k: int) -> np.ndarray:
+    """Índices das k maiores similaridades de uma linha, em ordem decrescente"""
+    k = min(k, len(similarities))
+    top = np.argpartition(-similarities, k - 1)[:k]
+    return top[np.argsort(-similarities[top])]
+
+def top_k_above(similarities: np.ndarray, k: int, threshold: float) -> np.ndarray:
+    """Índices das k maiores similaridades >= threshold, em ordem decrescente"""
+    # Filtro vetorizado antes da seleção: o laço em Python só vê os índices aprovados
+    candidates = np.flatnonzero(similarities >= threshold)
+    if len(candidates) <= k:
+        return candidates[np.argsort(-similarities[candidates])]
+    return candidates[top_k(similarities[candidates], k)]
@@ -0,0 +1,34 @@
+"""
+Política de event loop dos pontos de entrada (CLI e inicializador)
+Usa o uvloop, se instalado, no lugar do loop padrão do asyncio
+"""
+
+import sys
+import asyncio
+import logging
+from src.utils.http_client import aclose_async_http_client
+
+logger = logging.getLogger(__name__)
+
+def install_uvloop() -> bool:
+    """Instala a política do uvloop para os próximos asyncio.run(); False se indisponível"""
+    if sys.platform == "win32":
+        return False
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.debug("⚡ Event loop: uvloop")
+    return True
+
+def run(coro):
+    """asyncio.run que fecha o cliente HTTP assíncrono do loop antes de encerrá-lo"""
+    async def scoped():
+        try:
+            return await coro
+        finally:
+            # Cada asyncio.run cria um loop novo: sem isso o pool de conexões dele vazaria
+            await aclose_async_http_client()
+    
+    return asyncio.run(scoped())
@@ -0,0 +1,83 @@
+"""
+Snapshot plano (NumPy) dos vetores categóricos
+A busca é exata por produto escalar em memória; carregar as matrizes de um .npz evita
+o collection.get() do Chroma, que devolve cada vetor como lista de floats do Python.
+"""
+
+import os
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from src.config.settings import EMBEDDING_SIGNATURE, CATEGORY_MATRICES_PATH
+
+logger = logging.getLogger(__name__)
+
+class FlatEmbeddingStore:
+    """Matrizes float32 normalizadas (N, D) e documentos por categoria, gravadas em um único .npz"""
+
+    def __init__(self, path: str = CATEGORY_MATRICES_PATH):
+        self.path = path
+
+    @staticmethod
+    def split_by_category(data: dict) -> Tuple[Dict[str, np.ndarray], Dict[str, List[str]]]:
+        """Separa o resultado de collection.get() pelo metadado "category", normalizando as linhas"""
+        rows_by_category: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(data["metadatas"]):
+            rows_by_category.setdefault((metadata or {}).get("category"), []).append(i)
+
+        embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+        matrices, documents = {}, {}
+        for category, rows in rows_by_category.items():
+            matrix = embeddings[rows]
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrices[category] = matrix
+            documents[category] = [data["documents"][i] for i in rows]
+        return matrices, documents
+
+    def save(self, matrices: Dict[str, np.ndarray], documents: Dict[str, List[str]], values_digest: str):
+        """Grava o snapshot de forma atômica (arquivo temporário + rename)"""
+        arrays = {
+            "signature": np.asarray(EMBEDDING_SIGNATURE),
+            # Digest dos valores da coleção exportada (o mesmo gravado nos metadados do Chroma)
+            "values_digest": np.asarray(values_digest),
+            "categories": np.asarray(list(matrices), dtype=str),
+            "count": np.asarray(sum(len(docs) for docs in documents.values()))
+        }
+        for i, category in enumerate(matrices):
+            arrays[f"matrix_{i}"] = matrices[category]
+            arrays[f"documents_{i}"] = np.asarray(documents[category], dtype=str)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, self.path)
+
+    def load(self, expected_digest: str, expected_count: Optional[int] = None
+             ) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, List[str]]]]:
+        """Matrizes e documentos do snapshot; None se ausente, de outro espaço vetorial ou desatualizado"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with np.load(self.path) as data:
+                if str(data["signature"]) != EMBEDDING_SIGNATURE:
+                    return None
+                # Mesma contagem não basta: um upsert incremental troca valores sem mudar o total
+                if "values_digest" not in data.files or str(data["values_digest"]) != expected_digest:
+                    return None
+                if expected_count is not None and int(data["count"]) != expected_count:
+                    return None
+                matrices, documents = {}, {}
+                for i, category in enumerate(data["categories"].tolist()):
+                    matrices[category] = data[f"matrix_{i}"]
+                    documents[category] = data[f"documents_{i}"].tolist()
+            return matrices, documents
+        except Exception as e:
+            logger.warning("⚠️ Snapshot de vetores ignorado: %s", e)
+            return None
+    
+    def invalidate(self):
+        """Remove o snapshot (a coleção mudou e ele deixou de descrevê-la)"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,136 @@
+"""
+Clientes HTTP compartilhados para as chamadas à API da OpenAI
+Reaproveitam conexões keep-alive (e HTTP/2, se o pacote h2 estiver instalado)
+em vez de refazer TCP + TLS a cada requisição
+"""
+
+import random
+import asyncio
+import logging
+import threading
+import weakref
+import httpx
+from functools import lru_cache
+from src.config.settings import (
+    OPENAI_BASE_URL, OPENAI_TIMEOUT_SECONDS, OPENAI_CONNECT_TIMEOUT_SECONDS, HTTP_MAX_CONNECTIONS,
+    OPENAI_MAX_INFLIGHT, OPENAI_MAX_RETRIES, OPENAI_RETRY_INITIAL_SECONDS, OPENAI_RETRY_MAX_SECONDS, get_openai_api_key
+)
+from src.utils.rate_limiter import RateLimitGate
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# orjson (opcional) serializa/decodifica os corpos direto em bytes, bem mais rápido que o json padrão
+try:
+    import orjson
+    
+    def json_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+    
+    json_loads = orjson.loads
+except ImportError:
+    import json
+    
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    
+    json_loads = json.loads
+
+_sync_client = None
+# Clientes assíncronos (e semáforos) ficam presos ao event loop em que foram criados
+_async_clients = weakref.WeakKeyDictionary()
+_inflight = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+# Respostas transitórias que valem nova tentativa
+RETRIABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+# Cota de chat observada nos cabeçalhos x-ratelimit-*/Retry-After, compartilhada pelo processo
+chat_rate_limit = RateLimitGate()
+
+def _client_options():
+    return {
+        "http2": _HTTP2,
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS),
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS
+        )
+    }
+
+def get_http_client() -> httpx.Client:
+    """Retorna o cliente síncrono do processo, criando-o na primeira chamada"""
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(**_client_options())
+    return _sync_client
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Retorna o cliente assíncrono do event loop corrente"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(**_client_options())
+        _async_clients[loop] = client
+    return client
+
+async def aclose_async_http_client():
+    """Fecha o cliente assíncrono do event loop corrente (antes de o loop ser encerrado)"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+@lru_cache(maxsize=4)
+def openai_headers(api_key: str) -> dict:
+    """Cabeçalhos de autenticação da API da OpenAI (montados uma vez por chave)"""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+def inflight_slot() -> asyncio.Semaphore:
+    """Semáforo que limita as chat completions simultâneas do event loop corrente"""
+    loop = asyncio.get_running_loop()
+    semaphore = _inflight.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(OPENAI_MAX_INFLIGHT)
+        _inflight[loop] = semaphore
+    return semaphore
+
+def retry_delay(attempt: int) -> float:
+    """Backoff exponencial com jitter: metade fixa, metade aleatória"""
+    delay = min(OPENAI_RETRY_MAX_SECONDS, OPENAI_RETRY_INITIAL_SECONDS * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+async def post_chat_completion(payload: dict) -> httpx.Response:
+    """
+    POST em /chat/completions pelo cliente assíncrono compartilhado do event loop
+    
+    Respeita o limite de requisições simultâneas e a cota informada pela API, e repete
+    a chamada em timeouts, falhas de conexão e respostas 429/5xx.
+    """
+    headers = openai_headers(get_openai_api_key())
+    async with inflight_slot():
+        for attempt in range(OPENAI_MAX_RETRIES + 1):
+            await chat_rate_limit.wait()
+            try:
+                response = await get_async_http_client().post(
+                    f"{OPENAI_BASE_URL}/chat/completions", headers=headers, content=json_dumps(payload)
+                )
+            except httpx.TransportError as e:
+                if attempt == OPENAI_MAX_RETRIES:
+                    raise
+                logger.warning("⚠️ Falha de conexão com a OpenAI (tentativa %d): %s", attempt + 1, e)
+            else:
+                chat_rate_limit.update(response.headers, response.status_code)
+                if response.status_code not in RETRIABLE_STATUS or attempt == OPENAI_MAX_RETRIES:
+                    return response
+                logger.warning("⚠️ OpenAI respondeu %d (tentativa %d)", response.status_code, attempt + 1)
+            await asyncio.sleep(retry_delay(attempt))
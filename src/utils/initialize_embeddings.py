@@ -4,234 +4,476 @@ Cria embeddings para busca por similaridade nas colunas categóricas
 """
 
 import os
-import pandas as pd
-from dotenv import load_dotenv
-from google.cloud import bigquery
-import requests
-import chromadb
-from chromadb.config import Settings
-import numpy as np
-from typing import List, Dict
-import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import sys
+import hashlib
+import logging
+import asyncio
 import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from tqdm import tqdm
+from typing import List, Dict, Optional
 from src.config.settings import (
-    OPENAI_BASE_URL, OPENAI_EMBEDDING_MODEL, CHROMA_PERSIST_DIRECTORY,
-    CHROMA_COLLECTIONS, get_openai_api_key, get_google_credentials,
-    THREAD_POOL_MAX_WORKERS, BATCH_SIZE
+    OPENAI_EMBEDDING_MODEL, OPENAI_EMBEDDING_DIMENSIONS, EMBEDDING_SIGNATURE,
+    CHROMA_CATEGORY_COLLECTION, CATEGORY_COLUMNS, get_openai_api_key, get_google_credentials,
+    EMBEDDING_INIT_CONCURRENCY, BATCH_SIZE, EMBEDDING_BATCH_MAX_TOKENS, CHROMA_WRITE_BATCH_SIZE,
+    SUPPRESS_WARNINGS, LOG_LEVEL
 )
+from src.utils.openai_client import OpenAIClient
+from src.utils.cached_embedder import CachedEmbedder
+from src.utils.chroma_singleton import get_client, get_collection, reset_collection
+from src.utils.flat_store import FlatEmbeddingStore
+from src.utils.event_loop import install_uvloop, run as run_async
 
 load_dotenv()
 
-class OpenAIClient:
-    """Custom OpenAI client using requests"""
-    
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        self.base_url = OPENAI_BASE_URL
-        self.headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-    
-    def create_embeddings(self, texts: List[str], model: str = OPENAI_EMBEDDING_MODEL) -> List[List[float]]:
-        """Create embeddings using OpenAI API"""
-        url = f"{self.base_url}/embeddings"
-        data = {
-            "model": model,
-            "input": texts,
-            "encoding_format": "float"
-        }
-        
-        response = requests.post(url, headers=self.headers, json=data)
-        response.raise_for_status()
+# Progresso por lote fica em DEBUG; a barra do tqdm mostra o andamento sem um print por lote.
+# Falhas de lote (WARNING) continuam visíveis mesmo com SUPPRESS_WARNINGS
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING if SUPPRESS_WARNINGS else logging.DEBUG)
+
+def _token_counter():
+    """Contador de tokens do modelo de embeddings (tiktoken, se instalado; senão estimativa conservadora)"""
+    try:
+        import tiktoken
         
-        result = response.json()
-        return [item["embedding"] for item in result["data"]]
+        encoding = tiktoken.encoding_for_model(OPENAI_EMBEDDING_MODEL)
+        return lambda text: len(encoding.encode(text))
+    except Exception:
+        # ~3 caracteres por token superestima o português: os lotes ficam abaixo do limite
+        return lambda text: len(text) // 3 + 1
+
+def pack_batches(texts: List[str], max_items: int = BATCH_SIZE, max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS):
+    """Agrupa os textos em lotes limitados por quantidade de itens e por total de tokens"""
+    count_tokens = _token_counter()
+    batches = []
+    current = []
+    current_tokens = 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and (len(current) == max_items or current_tokens + tokens > max_tokens):
+            batches.append((len(batches), current))
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        batches.append((len(batches), current))
+    return batches
+
+def _collapse_whitespace(value) -> str:
+    """Remove espaços nas pontas e colapsa espaços internos repetidos (a caixa é preservada)"""
+    return " ".join(str(value).split())
 
 class CategoryEmbeddingsInitializer:
     """Inicializa embeddings para colunas categóricas"""
     
     def __init__(self):
-        credentials_path = get_google_credentials()  # Valida credenciais
-        self.bq_client = bigquery.Client.from_service_account_json(credentials_path)
+        # Import tardio: as bibliotecas do Google só são carregadas quando o inicializador é criado
+        from google.cloud import bigquery, bigquery_storage
+        from google.oauth2 import service_account
+        
+        # Credenciais lidas uma vez e compartilhadas pelos clientes REST e Storage Read API (gRPC)
+        credentials = service_account.Credentials.from_service_account_file(
+            get_google_credentials(),
+            scopes=["https://www.googleapis.com/auth/cloud-platform"]
+        )
+        self.bq_client = bigquery.Client(credentials=credentials, project=credentials.project_id)
+        # Um único canal gRPC para as leituras de todas as colunas
+        self.bqstorage_client = bigquery_storage.BigQueryReadClient(credentials=credentials)
         self.openai_client = OpenAIClient(api_key=get_openai_api_key())
-        self.chroma_client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIRECTORY)
+        # Vetores já calculados (inclusive em inicializações anteriores) não são reenviados à API
+        self.embedding_cache = CachedEmbedder(self.openai_client)
+        self.chroma_client = get_client()
     
-    def extract_unique_values(self, column_name: str) -> List[str]:
-        """Extrai valores únicos de uma coluna categórica"""
+    def submit_unique_values(self, column_name: str):
+        """Submete a consulta de valores únicos de uma coluna e retorna o job sem aguardá-lo"""
         query = f"""
         SELECT DISTINCT {column_name}
         FROM `datario.adm_central_atendimento_1746.chamado`
         WHERE {column_name} IS NOT NULL
         AND {column_name} != ''
-        ORDER BY {column_name}
         """
         
         print(f"📥 Extraindo valores únicos para: {column_name}")
-        results = self.bq_client.query(query)
-        values = [row[0] for row in results if row[0] and str(row[0]).strip()]
+        return self.bq_client.query(query)
+    
+    def read_unique_values(self, column_name: str, query_job) -> List[str]:
+        """Aguarda o job e lê os valores únicos da coluna"""
+        # Arrow via Storage Read API: filtragem vetorizada, sem iterar linha a linha em Python
+        import pyarrow.compute as pc
+        
+        table = query_job.result().to_arrow(bqstorage_client=self.bqstorage_client)
+        column = pc.cast(table.column(column_name).combine_chunks(), "string")
+        # Descarta só valores com apenas espaços; os demais seguem exatamente como no banco,
+        # pois são usados depois em filtros de igualdade no SQL
+        mask = pc.and_(pc.is_valid(column), pc.not_equal(pc.utf8_length(pc.utf8_trim_whitespace(column)), 0))
+        values = column.filter(mask).to_pylist()
+        # Ordenação local (poucos milhares de strings) em vez de ORDER BY no BigQuery:
+        # mantém os IDs da coleção estáveis entre execuções sem o sort distribuído
+        values.sort()
         print(f"✅ {len(values)} valores únicos encontrados para {column_name}")
         return values
     
-    def create_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Cria embeddings para um lote de textos com retry e fallback"""
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                if not texts:
-                    return []
-                
-                # Filtrar textos válidos
-                valid_texts = [str(text).strip() for text in texts if text and str(text).strip()]
-                if not valid_texts:
-                    return []
-                
-                embeddings = self.openai_client.create_embeddings(valid_texts, OPENAI_EMBEDDING_MODEL)
-                return embeddings
-                
-            except Exception as e:
-                print(f"⚠️ Erro no lote (tentativa {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # Backoff exponencial
-                else:
-                    print(f"❌ Falhou após {max_retries} tentativas para o lote")
-                    return []
-    
-    def process_batch_parallel(self, batch_data):
-        """Processa um lote de dados em paralelo"""
+    def extract_unique_values(self, column_name: str) -> List[str]:
+        """Extrai valores únicos de uma coluna categórica"""
+        return self.read_unique_values(column_name, self.submit_unique_values(column_name))
+    
+    async def _embed_batch_async(self, semaphore, batch_data):
+        """Cria embeddings para um lote de textos (retentativas e cota ficam a cargo do cliente)"""
         batch_id, texts = batch_data
-        start_time = time.time()
         
-        embeddings = self.create_embeddings_batch(texts)
+        # Filtrar textos válidos
+        valid_texts = [str(text).strip() for text in texts if text and str(text).strip()]
+        if not valid_texts:
+            return batch_id, texts, np.empty((0, OPENAI_EMBEDDING_DIMENSIONS), dtype=np.float32)
         
-        elapsed_time = time.time() - start_time
-        embeddings_per_second = len(texts) / elapsed_time if elapsed_time > 0 else 0
+        async with semaphore:
+            start_time = time.time()
+            try:
+                embeddings = await self.openai_client.acreate_embeddings(valid_texts)
+            except Exception as e:
+                logger.error("❌ Falha definitiva no lote %s: %s", batch_id, e)
+                return batch_id, texts, np.empty((0, OPENAI_EMBEDDING_DIMENSIONS), dtype=np.float32)
         
-        print(f"📦 Lote {batch_id}: {len(texts)} embeddings em {elapsed_time:.2f}s ({embeddings_per_second:.1f} emb/s)")
+        elapsed_time = time.time() - start_time
+        logger.debug("📦 Lote %s: %d embeddings em %.2fs", batch_id, len(texts), elapsed_time)
         
         return batch_id, texts, embeddings
     
-    def initialize_collection(self, collection_name: str, column_name: str):
-        """Inicializa uma coleção ChromaDB com embeddings paralelos"""
-        print(f"\n🚀 Iniciando inicialização da coleção: {collection_name}")
+    async def _embed_all_async(self, batches):
+        """Dispara todos os lotes concorrentemente, limitados por um semáforo"""
+        semaphore = asyncio.Semaphore(EMBEDDING_INIT_CONCURRENCY)
+        total = sum(len(texts) for _, texts in batches)
         
-        # Extrair valores únicos
-        unique_values = self.extract_unique_values(column_name)
+        with tqdm(total=total, desc="embed", unit="txt", mininterval=0.5) as pbar:
+            async def run(batch):
+                result = await self._embed_batch_async(semaphore, batch)
+                pbar.update(len(batch[1]))
+                return result
+            
+            # Cliente HTTP compartilhado do event loop; o semáforo limita as conexões em uso
+            return await asyncio.gather(*(run(batch) for batch in batches))
+    
+    def create_embeddings_parallel(self, batches):
+        """Versão síncrona: retorna (batch_id, textos, embeddings) para cada lote"""
+        return run_async(self._embed_all_async(batches))
+    
+    def embed_columns(self, values_by_column: Dict[str, List[str]]):
+        """
+        Cria (ou recupera do cache) os embeddings dos valores de todas as colunas
         
-        if not unique_values:
-            print(f"⚠️ Nenhum valor encontrado para {column_name}")
-            return
+        Os lotes pendentes de todas as colunas entram num único fan-out assíncrono,
+        sem esperar uma coluna terminar para começar a próxima.
+        Retorna {coluna: (valores, embeddings)}.
+        """
+        representatives = {}
+        embedding_by_text = {}
+        pending_texts = []
+        for column_name, unique_values in values_by_column.items():
+            # Deduplicar variações de caixa/espaço (inclusive internos): um embedding por valor normalizado
+            representative_by_key = {}
+            if not unique_values:
+                representatives[column_name] = representative_by_key
+                print(f"⚠️ Nenhum valor encontrado para {column_name}")
+                continue
+            for value in unique_values:
+                collapsed = _collapse_whitespace(value)
+                representative_by_key.setdefault(collapsed.casefold(), collapsed)
+            representatives[column_name] = representative_by_key
+            texts_to_embed = list(representative_by_key.values())
+            
+            cached = self.embedding_cache.lookup(texts_to_embed)
+            embedding_by_text.update(cached)
+            column_pending = [text for text in texts_to_embed if text not in cached]
+            pending_texts.extend(column_pending)
+            
+            print(
+                f"📊 {column_name}: {len(unique_values)} valores, {len(texts_to_embed)} após deduplicação "
+                f"({1 - len(texts_to_embed) / len(unique_values):.0%} a menos), "
+                f"{len(texts_to_embed) - len(column_pending)} já em cache"
+            )
         
-        # Verificar se a coleção já existe e deletar
-        try:
-            existing_collection = self.chroma_client.get_collection(collection_name)
-            self.chroma_client.delete_collection(collection_name)
-            print(f"🗑️ Coleção existente {collection_name} deletada")
-        except:
-            pass
+        # Textos repetidos entre colunas são embedados uma única vez
+        pending_texts = list(dict.fromkeys(pending_texts))
         
-        # Criar nova coleção
-        collection = self.chroma_client.create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        # Dividir em lotes limitados por itens e por tokens (a cota da API é contada em tokens)
+        batches = pack_batches(pending_texts)
         
-        # Dividir em lotes
-        batch_size = BATCH_SIZE
-        batches = []
-        for i in range(0, len(unique_values), batch_size):
-            batch_texts = unique_values[i:i + batch_size]
-            batches.append((i // batch_size, batch_texts))
+        print(f"📊 Processando {len(pending_texts)} valores em {len(batches)} lotes de até {BATCH_SIZE} itens")
         
-        print(f"📊 Processando {len(unique_values)} valores em {len(batches)} lotes de até {batch_size} itens")
+        # Processar lotes concorrentemente (I/O assíncrono)
+        for batch_id, texts, embeddings in (self.create_embeddings_parallel(batches) if batches else []):
+            if len(embeddings) and len(embeddings) == len(texts):
+                embedding_by_text.update(zip(texts, embeddings))
+                self.embedding_cache.store(texts, embeddings)
+            else:
+                logger.warning("⚠️ Lote %s falhou: %d embeddings para %d textos", batch_id, len(embeddings), len(texts))
         
-        total_start_time = time.time()
-        all_embeddings = []
-        all_texts = []
+        # Cada valor original recebe o vetor do seu representante, escrito direto
+        # na sua linha de uma matriz float32 pré-alocada (sem lista de vetores intermediária)
+        results = {}
+        for column_name, unique_values in values_by_column.items():
+            representative_by_key = representatives[column_name]
+            all_texts = []
+            all_embeddings = np.empty((len(unique_values), OPENAI_EMBEDDING_DIMENSIONS), dtype=np.float32)
+            for value in unique_values:
+                embedding = embedding_by_text.get(representative_by_key[_collapse_whitespace(value).casefold()])
+                if embedding is not None:
+                    all_embeddings[len(all_texts)] = embedding
+                    all_texts.append(value)
+            results[column_name] = (all_texts, all_embeddings[:len(all_texts)])
         
-        # Processar lotes em paralelo
-        with ThreadPoolExecutor(max_workers=THREAD_POOL_MAX_WORKERS) as executor:
-            future_to_batch = {executor.submit(self.process_batch_parallel, batch): batch for batch in batches}
+        return results
+    
+    def embed_values(self, column_name: str, unique_values: List[str]):
+        """Cria (ou recupera do cache) os embeddings dos valores de uma coluna"""
+        return self.embed_columns({column_name: unique_values})[column_name]
+    
+    @staticmethod
+    def _record_id(column_name: str, value: str) -> str:
+        """ID derivado do conteúdo: estável entre execuções, sem colidir entre colunas"""
+        return f"{column_name}_{hashlib.sha256(value.encode('utf-8')).hexdigest()[:16]}"
+    
+    def _write_embeddings(self, collection, embedded):
+        """Grava (upsert) os vetores de cada coluna na coleção compartilhada"""
+        batch_size = min(CHROMA_WRITE_BATCH_SIZE, getattr(self.chroma_client, "max_batch_size", None) or CHROMA_WRITE_BATCH_SIZE)
+        for column_name, (all_texts, all_embeddings) in embedded.items():
+            if not all_texts:
+                print(f"❌ Falha ao criar embeddings para {column_name}")
+                continue
             
-            for future in as_completed(future_to_batch):
-                try:
-                    batch_id, texts, embeddings = future.result()
-                    if embeddings and len(embeddings) == len(texts):
-                        all_texts.extend(texts)
-                        all_embeddings.extend(embeddings)
-                    else:
-                        print(f"⚠️ Lote {batch_id} falhou: {len(embeddings)} embeddings para {len(texts)} textos")
-                except Exception as e:
-                    batch = future_to_batch[future]
-                    print(f"❌ Erro processando lote {batch[0]}: {e}")
+            print(f"💾 Gravando {len(all_texts)} embeddings de {column_name} em {collection.name}...")
+            ids = [self._record_id(column_name, value) for value in all_texts]
+            # Upserts em blocos: o Chroma rejeita lotes acima do max_batch_size e lotes
+            # enormes inflam a serialização; cada bloco vira lista só no momento da escrita
+            for start in range(0, len(all_texts), batch_size):
+                end = start + batch_size
+                collection.upsert(
+                    # chromadb 0.4 valida cada valor como float do Python (ndarray é rejeitado)
+                    embeddings=all_embeddings[start:end].tolist(),
+                    documents=all_texts[start:end],
+                    metadatas=[{"category": column_name}] * len(all_texts[start:end]),
+                    ids=ids[start:end]
+                )
+    
+    def _update_collection(self, collection, values_by_column) -> bool:
+        """
+        Atualização incremental: embeda só os valores novos e remove os que sumiram do BigQuery
         
-        # Inserir na coleção
-        if all_embeddings and all_texts:
-            print(f"💾 Inserindo {len(all_embeddings)} embeddings na coleção {collection_name}...")
-            
-            ids = [f"{collection_name}_{i}" for i in range(len(all_texts))]
-            
-            collection.add(
-                embeddings=all_embeddings,
-                documents=all_texts,
-                ids=ids
-            )
-            
-            total_elapsed = time.time() - total_start_time
-            avg_speed = len(all_embeddings) / total_elapsed if total_elapsed > 0 else 0
-            
-            print(f"✅ Coleção {collection_name} criada com {len(all_embeddings)} embeddings")
-            print(f"⏱️ Tempo total: {total_elapsed:.2f}s ({avg_speed:.1f} embeddings/s)")
-        else:
-            print(f"❌ Falha ao criar embeddings para {collection_name}")
-    
-    def initialize_all_collections(self):
-        """Inicializa todas as coleções categóricas"""
-        collections_config = {
-            CHROMA_COLLECTIONS["tipo"]: "tipo",
-            CHROMA_COLLECTIONS["subtipo"]: "subtipo",
-            CHROMA_COLLECTIONS["nome_unidade_organizacional"]: "nome_unidade_organizacional",
-            CHROMA_COLLECTIONS["id_unidade_organizacional_mae"]: "id_unidade_organizacional_mae"
+        Preserva o grafo HNSW existente. Retorna False quando a coleção não é reaproveitável
+        (outro espaço vetorial ou coluna ausente), caso em que ela deve ser recriada.
+        """
+        metadata = collection.metadata or {}
+        categories = set(metadata.get("categories", "").split(","))
+        if metadata.get("embedding_model") != EMBEDDING_SIGNATURE or any(
+            column not in categories for column, values in values_by_column.items() if values
+        ):
+            return False
+        
+        data = collection.get(include=["documents", "metadatas"])
+        known_ids = {
+            ((record_metadata or {}).get("category"), document): record_id
+            for record_id, document, record_metadata in zip(data["ids"], data["documents"], data["metadatas"])
         }
         
+        new_values = {}
+        current = set()
+        for column_name, values in values_by_column.items():
+            current.update((column_name, value) for value in values)
+            pending = [value for value in values if (column_name, value) not in known_ids]
+            if pending:
+                new_values[column_name] = pending
+        
+        # Só colunas extraídas com sucesso nesta execução têm valores removidos
+        stale_ids = [
+            record_id for (column_name, value), record_id in known_ids.items()
+            if column_name in values_by_column and (column_name, value) not in current
+        ]
+        
+        print(
+            f"🔁 Atualização incremental de {collection.name}: "
+            f"{sum(map(len, new_values.values()))} valores novos, {len(stale_ids)} removidos"
+        )
+        if stale_ids or new_values:
+            # O conteúdo vai mudar: digest e snapshot antigos deixam de descrever a coleção
+            self._write_digest(collection, None)
+            FlatEmbeddingStore().invalidate()
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+        if new_values:
+            self._write_embeddings(collection, self.embed_columns(new_values))
+        return True
+    
+    @staticmethod
+    def _record_digest(collection, values_digest: str, expected_count: int):
+        """Registra o digest dos valores só com a coleção completa (uma coleção parcial nunca parece atualizada)"""
+        count = collection.count()
+        if count != expected_count:
+            print(f"⚠️ Coleção {collection.name} incompleta ({count} de {expected_count}): digest não registrado")
+            return
+        
+        CategoryEmbeddingsInitializer._write_digest(collection, values_digest)
+    
+    @staticmethod
+    def _write_digest(collection, values_digest: Optional[str]):
+        """Grava (ou remove, com None) o digest dos valores nos metadados da coleção"""
+        # modify() do Chroma 0.4 substitui os metadados inteiros e rejeita hnsw:space,
+        # que já foi fixado no índice na criação da coleção
+        metadata = {
+            key: value for key, value in (collection.metadata or {}).items()
+            if key not in ("hnsw:space", "values_digest")
+        }
+        if values_digest is not None:
+            metadata["values_digest"] = values_digest
+        try:
+            collection.modify(metadata=metadata)
+        except Exception as e:
+            print(f"⚠️ Não foi possível atualizar o digest de {collection.name}: {e}")
+    
+    def initialize_all_collections(self, rebuild: bool = False):
+        """
+        Inicializa a coleção compartilhada com os valores de todas as colunas categóricas
+        
+        Por padrão atualiza a coleção existente de forma incremental; rebuild=True
+        apaga e recria a coleção do zero.
+        """
+        collection_name = CHROMA_CATEGORY_COLLECTION
+        print(f"\n🚀 Iniciando inicialização da coleção: {collection_name}")
         total_start_time = time.time()
         
-        for collection_name, column_name in collections_config.items():
+        # Extrair valores únicos de cada coluna: todos os jobs são submetidos de uma vez
+        # e rodam em paralelo no BigQuery; a espera total é a do mais lento, não a soma
+        query_jobs = {}
+        for column_name in CATEGORY_COLUMNS:
             try:
-                self.initialize_collection(collection_name, column_name)
+                query_jobs[column_name] = self.submit_unique_values(column_name)
             except Exception as e:
-                print(f"❌ Erro ao inicializar {collection_name}: {e}")
+                print(f"❌ Erro ao extrair {column_name}: {e}")
+        
+        # Leituras via Storage Read API em paralelo (uma thread por coluna, mesmo canal gRPC)
+        values_by_column = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(query_jobs))) as executor:
+            futures = {
+                column_name: executor.submit(self.read_unique_values, column_name, query_job)
+                for column_name, query_job in query_jobs.items()
+            }
+            for column_name, future in futures.items():
+                try:
+                    values_by_column[column_name] = future.result()
+                except Exception as e:
+                    print(f"❌ Erro ao extrair {column_name}: {e}")
         
+        # Vocabulário e espaço vetorial inalterados: a coleção atual continua válida
+        digest_parts = [EMBEDDING_SIGNATURE]
+        for column_name, values in values_by_column.items():
+            digest_parts.append(column_name)
+            digest_parts.extend(sorted(map(str, values)))
+        values_digest = hashlib.sha256("\n".join(digest_parts).encode("utf-8")).hexdigest()
+        try:
+            existing = self.chroma_client.get_collection(collection_name)
+        except Exception:
+            existing = None
+        if existing is not None and not rebuild:
+            if (existing.metadata or {}).get("values_digest") == values_digest:
+                print(f"✅ Coleção {collection_name} já está atualizada, nada a fazer")
+                self.export_snapshot()
+                self.verify_collections()
+                return
+            
+            if self._update_collection(existing, values_by_column):
+                self._record_digest(existing, values_digest, sum(map(len, values_by_column.values())))
+                self.export_snapshot(force=True)
+                print(f"\n🏁 Inicialização completa em {time.time() - total_start_time:.2f}s")
+                self.verify_collections()
+                return
+        
+        # Verificar se a coleção já existe e deletar
+        try:
+            self.chroma_client.delete_collection(collection_name)
+            reset_collection(collection_name)
+            print(f"🗑️ Coleção existente {collection_name} deletada")
+        except Exception:
+            pass
+        
+        # Criar nova coleção compartilhada por todas as colunas
+        collection = self.chroma_client.create_collection(
+            name=collection_name,
+            metadata={
+                "hnsw:space": "cosine",
+                "embedding_model": EMBEDDING_SIGNATURE,
+                # Metadados do Chroma só aceitam escalares: colunas separadas por vírgula
+                "categories": ",".join(column for column, values in values_by_column.items() if values)
+            }
+        )
+        
+        for column_name, unique_values in values_by_column.items():
+            if not unique_values:
+                print(f"⚠️ Nenhum valor encontrado para {column_name}")
+        
+        try:
+            embedded = self.embed_columns({column: values for column, values in values_by_column.items() if values})
+        except Exception as e:
+            print(f"❌ Erro ao criar embeddings: {e}")
+            embedded = {}
+        
+        self._write_embeddings(collection, embedded)
+        self._record_digest(collection, values_digest, sum(map(len, values_by_column.values())))
+        
+        self.export_snapshot(force=True)
         total_elapsed = time.time() - total_start_time
         print(f"\n🏁 Inicialização completa em {total_elapsed:.2f}s")
         
-        # Verificar status das coleções
+        # Verificar status da coleção
         self.verify_collections()
     
+    def export_snapshot(self, force: bool = False):
+        """Grava as matrizes da coleção em .npz para as tools carregarem sem o collection.get()"""
+        store = FlatEmbeddingStore()
+        try:
+            collection = self.chroma_client.get_collection(CHROMA_CATEGORY_COLLECTION)
+            values_digest = (collection.metadata or {}).get("values_digest")
+            if not values_digest:
+                # Coleção sem digest (incompleta): as tools leem direto do Chroma
+                store.invalidate()
+                print("⚠️ Coleção sem digest de valores: snapshot das matrizes não gravado")
+                return
+            if not force and store.load(values_digest, expected_count=collection.count()) is not None:
+                return
+            matrices, documents = store.split_by_category(
+                collection.get(include=["embeddings", "documents", "metadatas"])
+            )
+            store.save(matrices, documents, values_digest)
+            print(f"💾 Snapshot das matrizes gravado em {store.path}")
+        except Exception as e:
+            print(f"⚠️ Não foi possível gravar o snapshot das matrizes: {e}")
+    
     def verify_collections(self):
-        """Verifica o status das coleções criadas"""
-        print("\n🔍 Verificando coleções criadas:")
+        """Verifica quantos embeddings cada coluna tem na coleção compartilhada"""
+        print("\n🔍 Verificando coleção criada:")
         
         total_embeddings = 0
-        for collection_name in CHROMA_COLLECTIONS.values():
-            try:
-                collection = self.chroma_client.get_collection(collection_name)
-                count = collection.count()
+        try:
+            collection = get_collection(CHROMA_CATEGORY_COLLECTION)
+            for column_name in CATEGORY_COLUMNS:
+                count = len(collection.get(where={"category": column_name}, include=[])["ids"])
                 total_embeddings += count
-                print(f"  ✅ {collection_name}: {count} embeddings")
-            except Exception as e:
-                print(f"  ❌ {collection_name}: Erro - {e}")
+                print(f"  {'✅' if count else '❌'} {column_name}: {count} embeddings")
+        except Exception as e:
+            print(f"  ❌ {CHROMA_CATEGORY_COLLECTION}: Erro - {e}")
         
         print(f"\n📊 Total de embeddings criados: {total_embeddings}")
 
 def main():
     """Função principal para inicializar as coleções"""
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
+    install_uvloop()
     print("🎯 Iniciando inicialização de embeddings categóricos...")
     
     try:
         initializer = CategoryEmbeddingsInitializer()
-        initializer.initialize_all_collections()
+        # --rebuild: apaga e recria a coleção em vez da atualização incremental
+        initializer.initialize_all_collections(rebuild="--rebuild" in sys.argv[1:])
         print("\n🎉 Inicialização concluída com sucesso!")
         
     except Exception as e:
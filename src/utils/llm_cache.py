@@ -0,0 +1,83 @@
+"""
+Cache exato de completions do LLM
+Prompts idênticos (após normalizar caixa e espaços) para o mesmo modelo reaproveitam a resposta
+"""
+
+import logging
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+from src.config.settings import LLM_CACHE_DB_PATH, LLM_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+class LLMCache:
+    """Respostas do LLM em SQLite, chaveadas por sha256(modelo::prompt normalizado)"""
+
+    def __init__(self, db_path: Optional[str] = LLM_CACHE_DB_PATH, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = self._open_store(db_path) if db_path else None
+
+    @staticmethod
+    def _open_store(db_path: str):
+        """Abre o armazenamento; em caso de falha o cache fica desabilitado"""
+        try:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, response TEXT NOT NULL, ts REAL NOT NULL)")
+            conn.commit()
+            return conn
+        except sqlite3.Error as e:
+            logger.warning("⚠️ Cache de completions desabilitado: %s", e)
+            return None
+
+    @staticmethod
+    def _hash(prompt: str, model: str) -> str:
+        normalized = _WHITESPACE_RE.sub(" ", prompt.strip().lower())
+        return hashlib.sha256(f"{model}::{normalized}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, model: str) -> Optional[str]:
+        """Retorna a resposta armazenada para o prompt, se existir e não tiver expirado"""
+        if self._conn is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, ts FROM completions WHERE key = ?", (self._hash(prompt, model),)
+            ).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl_seconds:
+            return None
+        return row[0]
+
+    def update(self, prompt: str, model: str, response: str):
+        """Armazena a resposta gerada para o prompt"""
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, response, ts) VALUES (?, ?, ?)",
+                (self._hash(prompt, model), response, time.time())
+            )
+            self._conn.commit()
+
+_llm_cache = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMCache:
+    """Retorna o cache do processo, criando-o na primeira chamada"""
+    global _llm_cache
+    if _llm_cache is None:
+        with _cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMCache()
+    return _llm_cache
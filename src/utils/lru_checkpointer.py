@@ -0,0 +1,48 @@
+"""
+Checkpointer em memória com limite de threads (LRU)
+Evita que o MemorySaver cresça indefinidamente em processos de longa duração
+"""
+
+import threading
+from collections import OrderedDict
+from langgraph.checkpoint.memory import MemorySaver
+from src.config.settings import CHECKPOINT_MAX_THREADS
+
+class LRUCheckpointSaver(MemorySaver):
+    """MemorySaver que descarta as threads menos usadas ao exceder max_threads"""
+    
+    def __init__(self, max_threads: int = CHECKPOINT_MAX_THREADS):
+        super().__init__()
+        self.max_threads = max_threads
+        self._thread_order = OrderedDict()
+        self._order_lock = threading.Lock()
+    
+    def _touch(self, config):
+        """Marca a thread como usada recentemente e remove as excedentes"""
+        thread_id = config.get("configurable", {}).get("thread_id")
+        if thread_id is None:
+            return
+        
+        evicted = []
+        with self._order_lock:
+            self._thread_order[thread_id] = None
+            self._thread_order.move_to_end(thread_id)
+            while len(self._thread_order) > self.max_threads:
+                evicted_id, _ = self._thread_order.popitem(last=False)
+                evicted.append(evicted_id)
+        
+        for evicted_id in evicted:
+            self.delete_thread(evicted_id)
+    
+    def get_tuple(self, config):
+        """Recupera o checkpoint e atualiza a ordem de uso da thread"""
+        checkpoint_tuple = super().get_tuple(config)
+        if checkpoint_tuple is not None:
+            self._touch(config)
+        return checkpoint_tuple
+    
+    def put(self, config, checkpoint, metadata, new_versions):
+        """Armazena o checkpoint e aplica o limite de threads"""
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._touch(config)
+        return next_config
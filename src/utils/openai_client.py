@@ -0,0 +1,116 @@
+"""
+Cliente de embeddings da OpenAI compartilhado por agente, tools e inicializador
+Recebe os vetores em base64 (float32 binário) em vez de listas JSON de floats
+"""
+
+import time
+import base64
+import asyncio
+import logging
+import httpx
+import numpy as np
+from functools import lru_cache
+from typing import Dict, List
+from src.config.settings import (
+    OPENAI_BASE_URL, OPENAI_EMBEDDING_MODEL, OPENAI_EMBEDDING_DIMENSIONS, OPENAI_MAX_RETRIES
+)
+from src.utils.http_client import (
+    RETRIABLE_STATUS, get_http_client, get_async_http_client, json_dumps, json_loads, openai_headers, retry_delay
+)
+from src.utils.rate_limiter import RateLimitGate
+
+logger = logging.getLogger(__name__)
+
+def embeddings_payload(texts: List[str], model: str = OPENAI_EMBEDDING_MODEL) -> Dict:
+    """Corpo da requisição de embeddings"""
+    return {
+        "model": model,
+        "input": texts,
+        "dimensions": OPENAI_EMBEDDING_DIMENSIONS,
+        "encoding_format": "base64"
+    }
+
+@lru_cache(maxsize=4)
+def _embeddings_body_suffix(model: str) -> bytes:
+    """Campos fixos do corpo (modelo, dimensões, formato) serializados uma única vez por modelo"""
+    fields = embeddings_payload([], model)
+    del fields["input"]
+    return b"," + json_dumps(fields)[1:]
+
+def embeddings_body(texts: List[str], model: str = OPENAI_EMBEDDING_MODEL) -> bytes:
+    """Corpo JSON da requisição: só a lista de textos é serializada a cada chamada"""
+    return b'{"input":' + json_dumps(texts) + _embeddings_body_suffix(model)
+
+def decode_embeddings(result: Dict) -> np.ndarray:
+    """Decodifica a resposta base64 em uma matriz float32 (N, D), na ordem da entrada"""
+    data = result["data"]
+    matrix = np.empty((len(data), OPENAI_EMBEDDING_DIMENSIONS), dtype=np.float32)
+    # Cada vetor é decodificado direto na sua linha (sem lista intermediária nem np.stack)
+    for item in data:
+        matrix[item["index"]] = np.frombuffer(base64.b64decode(item["embedding"]), dtype=np.float32)
+    return matrix
+
+class OpenAIClient:
+    """Custom OpenAI client using a pooled httpx client"""
+    
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.base_url = OPENAI_BASE_URL
+        self.headers = openai_headers(api_key)
+        # Cliente compartilhado: reaproveita conexões keep-alive entre chamadas
+        self._client = get_http_client()
+        # Cota da API observada nas respostas, compartilhada pelas chamadas síncronas e assíncronas
+        self.rate_limit = RateLimitGate()
+    
+    def create_embeddings(self, texts: List[str], model: str = OPENAI_EMBEDDING_MODEL) -> np.ndarray:
+        """
+        Create embeddings using OpenAI API (uma linha por texto)
+        
+        Caminho das perguntas do usuário: falhas de conexão e respostas 429/5xx são repetidas
+        com backoff, reaproveitando a conexão keep-alive do cliente compartilhado.
+        """
+        body = embeddings_body(texts, model)
+        for attempt in range(OPENAI_MAX_RETRIES + 1):
+            self.rate_limit.wait_sync()
+            try:
+                response = self._client.post(f"{self.base_url}/embeddings", headers=self.headers, content=body)
+            except httpx.TransportError as e:
+                if attempt == OPENAI_MAX_RETRIES:
+                    raise
+                logger.warning("⚠️ Falha de conexão nos embeddings (tentativa %d): %s", attempt + 1, e)
+            else:
+                self.rate_limit.update(response.headers, response.status_code)
+                if response.status_code not in RETRIABLE_STATUS or attempt == OPENAI_MAX_RETRIES:
+                    break
+                logger.warning("⚠️ Embeddings: OpenAI respondeu %d (tentativa %d)", response.status_code, attempt + 1)
+            time.sleep(retry_delay(attempt))
+        response.raise_for_status()
+        
+        return decode_embeddings(json_loads(response.content))
+    
+    async def acreate_embeddings(self, texts: List[str], model: str = OPENAI_EMBEDDING_MODEL) -> np.ndarray:
+        """
+        Versão assíncrona de create_embeddings, pelo cliente compartilhado do event loop
+        
+        Mesmas retentativas do caminho síncrono; em 429 a espera segue o Retry-After via rate_limit.
+        """
+        body = embeddings_body(texts, model)
+        for attempt in range(OPENAI_MAX_RETRIES + 1):
+            await self.rate_limit.wait()
+            try:
+                response = await get_async_http_client().post(
+                    f"{self.base_url}/embeddings", headers=self.headers, content=body
+                )
+            except httpx.TransportError as e:
+                if attempt == OPENAI_MAX_RETRIES:
+                    raise
+                logger.warning("⚠️ Falha de conexão nos embeddings (tentativa %d): %s", attempt + 1, e)
+            else:
+                self.rate_limit.update(response.headers, response.status_code)
+                if response.status_code not in RETRIABLE_STATUS or attempt == OPENAI_MAX_RETRIES:
+                    break
+                logger.warning("⚠️ Embeddings: OpenAI respondeu %d (tentativa %d)", response.status_code, attempt + 1)
+            await asyncio.sleep(retry_delay(attempt))
+        response.raise_for_status()
+        
+        return decode_embeddings(json_loads(response.content))
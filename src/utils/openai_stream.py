@@ -0,0 +1,94 @@
+"""
+Chat completions da OpenAI em modo streaming
+Repassa cada trecho gerado ao stream "custom" do LangGraph enquanto acumula a resposta
+"""
+
+import logging
+from typing import Callable, Dict, Optional, Tuple
+from src.config.settings import OPENAI_BASE_URL
+from src.utils.http_client import (
+    RETRIABLE_STATUS, chat_rate_limit, get_async_http_client, inflight_slot, json_dumps, json_loads,
+    openai_headers, post_chat_completion
+)
+
+logger = logging.getLogger(__name__)
+
+def _get_token_writer():
+    """Retorna o writer do stream do LangGraph ou um no-op fora da execução do grafo"""
+    try:
+        from langgraph.config import get_stream_writer
+        return get_stream_writer()
+    except (ImportError, RuntimeError):
+        return lambda chunk: None
+
+async def _complete(payload: Dict) -> Tuple[int, str]:
+    """Chat completion sem streaming (fallback, com retentativas)"""
+    response = await post_chat_completion(payload)
+    if response.status_code != 200:
+        return response.status_code, ""
+    return 200, json_loads(response.content)["choices"][0]["message"]["content"] or ""
+
+async def stream_chat_completion(api_key: str, payload: Dict,
+                                 stop: Optional[Callable[[str], bool]] = None,
+                                 emit: bool = True) -> Tuple[int, str]:
+    """
+    Executa uma chat completion com stream=True
+    
+    Se o streaming falhar antes do primeiro trecho (inclusive com 429/5xx), repete a
+    chamada sem streaming, com retentativas, e repassa a resposta inteira de uma vez.
+    
+    Args:
+        stop: Predicado sobre o texto acumulado, chamado a cada trecho (deve examinar só o
+            final novo); quando verdadeiro, a conexão é fechada e a geração restante
+            (não faturada) é descartada
+        emit: Se False, os trechos não são repassados ao stream "custom" do grafo
+    
+    Returns:
+        Tupla (status_code, conteúdo gerado até o fim ou até a parada)
+    """
+    writer = _get_token_writer() if emit else (lambda chunk: None)
+    text = ""
+    headers = openai_headers(api_key)
+    
+    client = get_async_http_client()
+    try:
+        await chat_rate_limit.wait()
+        async with inflight_slot(), client.stream(
+            "POST",
+            f"{OPENAI_BASE_URL}/chat/completions",
+            headers={**headers, "Accept": "text/event-stream"},
+            content=json_dumps({**payload, "stream": True})
+        ) as response:
+            chat_rate_limit.update(response.headers, response.status_code)
+            if response.status_code in RETRIABLE_STATUS:
+                raise RuntimeError(f"status {response.status_code}")
+            if response.status_code != 200:
+                return response.status_code, ""
+            
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    break
+                
+                choices = json_loads(data).get("choices")
+                if not choices:
+                    continue
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    text += delta
+                    writer({"token": delta})
+                    if stop is not None and stop(text):
+                        # Sair do bloco fecha a resposta: o provedor interrompe a geração
+                        break
+    except Exception as e:
+        if text:
+            raise
+        logger.warning("⚠️ Streaming indisponível, usando resposta completa: %s", e)
+        status_code, content = await _complete(payload)
+        if content:
+            writer({"token": content})
+        return status_code, content
+    
+    return 200, text
@@ -0,0 +1,76 @@
+"""
+Controle de taxa guiado pelos cabeçalhos x-ratelimit-* da OpenAI
+Só segura novas requisições quando a cota restante está de fato perto do fim
+"""
+
+import re
+import time
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_reset(value: str) -> float:
+    """Converte durações no formato da OpenAI ("20ms", "1s", "6m0s") em segundos"""
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in _DURATION_RE.findall(value or ""))
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Espera pedida pelo servidor em segundos: retry-after-ms, ou Retry-After em segundos ou data HTTP"""
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RateLimitGate:
+    """Bloqueia as requisições até o reset da janela quando restam poucas requisições/tokens"""
+    
+    def __init__(self, min_remaining_requests: int = 1, min_remaining_tokens: int = 0):
+        self.min_remaining_requests = min_remaining_requests
+        self.min_remaining_tokens = min_remaining_tokens
+        self._resume_at = 0.0
+    
+    def delay(self) -> float:
+        """Segundos que faltam para liberar novas requisições"""
+        return max(0.0, self._resume_at - time.monotonic())
+    
+    async def wait(self):
+        """Aguarda, se necessário, antes de disparar uma requisição"""
+        delay = self.delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def wait_sync(self):
+        """Versão bloqueante de wait() para clientes síncronos"""
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+    
+    def pause(self, seconds: float):
+        """Adia novas requisições (ex: Retry-After de uma resposta 429)"""
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+    
+    def update(self, headers: Mapping[str, str], status_code: int = 200):
+        """Atualiza o estado com os cabeçalhos de cota (e Retry-After em 429/503) da última resposta"""
+        if status_code in (429, 503):
+            retry_after = parse_retry_after(headers)
+            if retry_after is not None or status_code == 429:
+                self.pause(1.0 if retry_after is None else retry_after)
+        for kind, minimum in (("requests", self.min_remaining_requests), ("tokens", self.min_remaining_tokens)):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is not None and int(remaining) <= minimum:
+                self.pause(parse_reset(headers.get(f"x-ratelimit-reset-{kind}", "")))